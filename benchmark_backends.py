@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from queue import Empty
+
+SAMPLE_SENTENCES = [
+    "We offer free shipping on all orders over $50 within the continental United States.",
+    "Returns are accepted within 30 days of purchase with the original receipt.",
+    "Our support team is available Monday through Friday from 9am to 5pm.",
+    "You can track your order status from the account dashboard at any time.",
+    "Gift cards never expire and can be used on any product in our store.",
+    "All payments are processed securely using industry standard encryption.",
+]
+
+def measure_backend(backend, sentences):
+    import torch
+    from config import Config
+    from generate_qa_intents import build_utterance_prompt
+    from inference_backend import load_backend
+
+    load_start = time.perf_counter()
+    model, tokenizer = load_backend(backend, Config.MODEL_NAME, 'float32', 'cpu')
+    load_time = time.perf_counter() - load_start
+
+    outputs = []
+    generated_tokens = 0
+    generate_start = time.perf_counter()
+    for sentence in sentences:
+        inputs = tokenizer(build_utterance_prompt(sentence, 5), return_tensors='pt')
+        with torch.inference_mode():
+            sequences = model.generate(**inputs, max_length=Config.MAX_UTTERANCE_LENGTH, do_sample=False)
+        generated_tokens += int((sequences != tokenizer.pad_token_id).sum())
+        outputs.append(tokenizer.decode(sequences[0], skip_special_tokens=True))
+    generate_time = time.perf_counter() - generate_start
+
+    return {
+        "backend": backend,
+        "load_time": round(load_time, 2),
+        "tokens_per_second": round(generated_tokens / generate_time, 2) if generate_time else 0,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "outputs": outputs
+    }
+
+def run_backend(backend, sentences, queue):
+    # A backend that fails to load still reports, so the parent never waits on an empty queue
+    try:
+        queue.put(measure_backend(backend, sentences))
+    except Exception as e:
+        queue.put({"backend": backend, "error": f"{type(e).__name__}: {str(e)}"})
+
+def wait_for_report(backend, process, queue):
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            # A child killed outright (OOM, segfault) never reaches its except block
+            if not process.is_alive():
+                return {"backend": backend, "error": f"Process exited with code {process.exitcode}"}
+
+def token_overlap(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def compare_backends(backends, sentences):
+    # Each backend runs in a fresh process so peak RSS is not shared between them
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for backend in backends:
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, sentences, queue))
+        process.start()
+        report = wait_for_report(backend, process, queue)
+        process.join()
+        reports.append(report)
+
+    measured = [r for r in reports if "error" not in r]
+    if not measured:
+        return reports
+    baseline = next((r for r in measured if r["backend"] == 'torch'), measured[0])
+    for report in measured:
+        pairs = list(zip(baseline["outputs"], report["outputs"]))
+        report["overlap_vs_fp32"] = round(sum(token_overlap(a, b) for a, b in pairs) / len(pairs), 3)
+        report["exact_match_vs_fp32"] = round(sum(a == b for a, b in pairs) / len(pairs), 3)
+        del report["outputs"]
+    return reports
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or ['torch', 'torch_int8', 'onnx']
+    if 'torch' not in backends:
+        backends.insert(0, 'torch')
+    print(json.dumps(compare_backends(backends, SAMPLE_SENTENCES), indent=4))
@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+import sys
+import time
+from bs4 import BeautifulSoup
+from config import Config
+from content_extractor import extract_page
+
+def legacy_parse_website_content(markup):
+    # The multi-pass BeautifulSoup extractor that extract_page replaced
+    soup = BeautifulSoup(markup, 'html.parser')
+    for element in soup.find_all(Config.EXCLUDED_ELEMENTS):
+        element.decompose()
+    for element in soup.find_all(class_=Config.EXCLUDED_CLASSES):
+        element.decompose()
+    for element in soup.find_all(id=Config.EXCLUDED_IDS):
+        element.decompose()
+
+    content = []
+    for tag in Config.CONTENT_TAGS:
+        for element in soup.find_all(tag):
+            text = ' '.join(element.get_text().split())
+            if text and len(text.split()) > Config.MIN_WORDS_PER_ELEMENT:
+                content.append(text)
+    return content
+
+def time_extractor(extract, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [extract(markup) for markup in pages]
+    return (time.perf_counter() - start) / repeat, outputs
+
+def count_words(blocks):
+    return sum(len(block.split()) for block in blocks)
+
+def benchmark(directory, repeat=3):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            pages.append(f.read())
+    if not pages:
+        raise SystemExit(f"No .html files found in {directory}")
+
+    total_mb = sum(len(markup.encode('utf-8')) for markup in pages) / (1024 * 1024)
+    legacy_time, legacy_blocks = time_extractor(legacy_parse_website_content, pages, repeat)
+    lxml_time, lxml_blocks = time_extractor(
+        lambda markup: extract_page(markup)[0].split('\n'), pages, repeat
+    )
+
+    def report(seconds, outputs):
+        blocks = [block for page in outputs for block in page if block]
+        return {
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(len(pages) / seconds, 1) if seconds else 0,
+            "mb_per_second": round(total_mb / seconds, 2) if seconds else 0,
+            "blocks": len(blocks),
+            "words": count_words(blocks),
+            "unique_blocks": len(set(blocks))
+        }
+
+    return {
+        "pages": len(pages),
+        "megabytes": round(total_mb, 2),
+        "legacy_bs4": report(legacy_time, legacy_blocks),
+        "lxml_single_pass": report(lxml_time, lxml_blocks),
+        "speedup": round(legacy_time / lxml_time, 2) if lxml_time else None
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("Usage: python benchmark_extractor.py <directory of saved .html pages> [repeat]")
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(json.dumps(benchmark(sys.argv[1], repeat), indent=4))
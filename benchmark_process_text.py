@@ -0,0 +1,100 @@
+import glob
+import json
+import os
+import random
+import sys
+import time
+from nltk.corpus import stopwords
+from nltk.tokenize import sent_tokenize
+from config import Config
+from content_extractor import extract_page
+from process_text import extract_sentences
+
+def legacy_extract_sentences(text, batch_size=1000):
+    # The list-building extractor that rebuilt the stopword set for every sentence
+    def is_meaningful_sentence(sentence):
+        words = sentence.split()
+        if len(words) < Config.MIN_WORDS_PER_ELEMENT:
+            return False
+        stop_words = set(stopwords.words('english'))
+        content_words = [w.lower() for w in words if w.lower() not in stop_words]
+        return len(content_words) >= 2
+
+    sentences = []
+    paragraphs = text.split('\n')
+    for i in range(0, len(paragraphs), batch_size):
+        batch_text = ' '.join(paragraphs[i:i + batch_size])
+        sentences.extend(sent.strip() for sent in sent_tokenize(batch_text) if is_meaningful_sentence(sent))
+    return sentences
+
+def load_corpus(path):
+    if os.path.isfile(path):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+    blocks = []
+    for file_path in sorted(glob.glob(os.path.join(path, '*'))):
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        # Saved pages go through the real extractor so the text looks like a crawl
+        blocks.append(extract_page(content)[0] if file_path.endswith('.html') else content)
+    return '\n'.join(blocks)
+
+def synthetic_corpus(megabytes, seed=13):
+    rng = random.Random(seed)
+    words = (
+        "our team ships orders within two business days and refunds are issued to the original "
+        "payment method once the returned item has been inspected by the warehouse staff customers "
+        "can track every parcel from the account page or contact support by email phone or chat"
+    ).split()
+    paragraphs = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        sentences = [
+            ' '.join(rng.choice(words) for _ in range(rng.randint(4, 24))).capitalize() + '.'
+            for _ in range(rng.randint(1, 6))
+        ]
+        paragraphs.append(' '.join(sentences))
+        size += len(paragraphs[-1]) + 1
+    return '\n'.join(paragraphs)
+
+def time_extractor(extract, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        sentences = list(extract(text))
+    return (time.perf_counter() - start) / repeat, sentences
+
+def benchmark(text, repeat=3):
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+
+    def report(seconds, sentences):
+        return {
+            "seconds": round(seconds, 4),
+            "sentences": len(sentences),
+            "sentences_per_second": round(len(sentences) / seconds, 1) if seconds else 0,
+            "mb_per_second": round(megabytes / seconds, 2) if seconds else 0
+        }
+
+    legacy_time, legacy_sentences = time_extractor(legacy_extract_sentences, text, repeat)
+    serial_time, serial_sentences = time_extractor(extract_sentences, text, repeat)
+
+    return {
+        "megabytes": round(megabytes, 2),
+        "legacy": report(legacy_time, legacy_sentences),
+        "generator": report(serial_time, serial_sentences),
+        "speedup": round(legacy_time / serial_time, 2) if serial_time else None
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(
+            "Usage: python benchmark_process_text.py <text file | directory | --synthetic MB> [repeat]"
+        )
+    if sys.argv[1] == '--synthetic':
+        corpus = synthetic_corpus(float(sys.argv[2]))
+        arguments = sys.argv[3:]
+    else:
+        corpus = load_corpus(sys.argv[1])
+        arguments = sys.argv[2:]
+    repeat = int(arguments[0]) if arguments else 3
+    print(json.dumps(benchmark(corpus, repeat), indent=4))
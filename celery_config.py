@@ -1,9 +1,13 @@
+import os
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_init, worker_ready, worker_shutdown
+from kombu import Queue
+from config import Config
 
 celery_app = Celery(
     'iris',
-    broker='redis://localhost:6379/0',
-    backend='redis://localhost:6379/0',
+    broker=Config.REDIS_URL,
+    backend=Config.REDIS_URL,
     include=['tasks']
 )
 
@@ -12,8 +16,126 @@ celery_app.conf.update(
     result_serializer='json',
     accept_content=['json'],
     task_track_started=True,
-    task_time_limit=3600,
+    task_time_limit=Config.TASK_TIME_LIMIT,
     worker_prefetch_multiplier=1,
     result_expires=86400,
+    task_store_eager_result=True,  # Synchronous jobs stay visible to requests coalescing onto them
     broker_connection_retry_on_startup=True
 )
+
+SCRAPE_TASKS = {'tasks.scrape_website_task', 'tasks.merge_website_results_task'}
+DISPATCH_TASKS = {'tasks.process_website_task'}
+
+# Start a worker for one side with IRIS_WORKER_ROLE=scrape or IRIS_WORKER_ROLE=inference
+WORKER_PROFILES = {
+    'scrape': {
+        'queues': [Config.SCRAPE_QUEUE],
+        'pool': Config.SCRAPE_WORKER_POOL,
+        'concurrency': Config.SCRAPE_WORKER_CONCURRENCY,
+        'prefetch_multiplier': 4
+    },
+    'inference': {
+        'queues': [Config.INFERENCE_QUEUE, Config.SYNC_QUEUE],
+        'pool': 'prefork',
+        'concurrency': Config.INFERENCE_WORKER_CONCURRENCY,
+        'prefetch_multiplier': 1
+    }
+}
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    if name in DISPATCH_TASKS:
+        # Incremental runs generate inside the dispatching task, so they need an inference slot
+        incremental = kwargs.get('incremental', args[2] if len(args) > 2 else False)
+        return {'queue': Config.INFERENCE_QUEUE if incremental else Config.SCRAPE_QUEUE}
+    if name in SCRAPE_TASKS:
+        return {'queue': Config.SCRAPE_QUEUE}
+    return {'queue': Config.INFERENCE_QUEUE}
+
+if Config.SPLIT_QUEUES:
+    celery_app.conf.task_routes = (route_task,)
+
+worker_role = os.getenv('IRIS_WORKER_ROLE')
+if worker_role in WORKER_PROFILES:
+    profile = WORKER_PROFILES[worker_role]
+    celery_app.conf.update(
+        task_queues=[Queue(name) for name in profile['queues']],
+        worker_pool=profile['pool'],
+        worker_concurrency=profile['concurrency'],
+        worker_prefetch_multiplier=profile['prefetch_multiplier']
+    )
+elif worker_role is None:
+    # A combined worker generates too, so it also answers sync jobs
+    celery_app.conf.task_queues = [Queue(celery_app.conf.task_default_queue), Queue(Config.SYNC_QUEUE)]
+
+model_preloaded = False
+
+def serves_inference():
+    return worker_role in (None, 'inference')
+
+@worker_init.connect
+def check_worker_dependencies(**kwargs):
+    # Fail at worker start with install instructions instead of on the first job
+    from process_text import ensure_nltk_data
+    ensure_nltk_data()
+
+    if Config.WORKER_PRELOAD_MODEL and serves_inference():
+        preload_worker_model()
+
+def preload_worker_model():
+    # worker_init runs in the parent before the pool forks, so every child inherits warm weights
+    global model_preloaded
+    import gc
+    from model_registry import preload
+    preload()
+    # Frozen objects are skipped by the collector, so children do not dirty their shared pages
+    gc.collect()
+    gc.freeze()
+    model_preloaded = True
+
+@worker_ready.connect
+def announce_worker_ready(sender=None, **kwargs):
+    if not model_preloaded:
+        return
+    # The parent tracks every running request, whichever pool executes it
+    from celery.worker.state import active_requests
+    from worker_status import start_ready_heartbeat
+    controller = getattr(sender, 'controller', None)
+    slots = getattr(controller, 'concurrency', None) or celery_app.conf.worker_concurrency or os.cpu_count()
+    start_ready_heartbeat(sender.hostname, slots, lambda: len(active_requests))
+
+@task_prerun.connect
+def claim_worker_slot(task=None, **kwargs):
+    # Counted as the task starts so a sync request never waits on a slot the heartbeat still shows free
+    if model_preloaded and not task.request.is_eager:
+        from worker_status import mark_task_started
+        mark_task_started(task.request.hostname)
+
+@task_postrun.connect
+def free_worker_slot(task=None, **kwargs):
+    if model_preloaded and not task.request.is_eager:
+        from worker_status import mark_task_finished
+        mark_task_finished(task.request.hostname)
+
+@worker_shutdown.connect
+def withdraw_worker_ready(sender=None, **kwargs):
+    if not model_preloaded:
+        return
+    from worker_status import mark_worker_stopped
+    mark_worker_stopped(sender.hostname)
+
+@worker_process_init.connect
+def pin_inference_process(**kwargs):
+    if worker_role != 'inference' or not Config.INFERENCE_PIN_CORES:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+
+    from billiard.process import current_process
+    index = getattr(current_process(), 'index', None)
+    if index is None:
+        return
+
+    # Each child gets its own TORCH_THREADS cores so processes do not fight over them
+    cores = sorted(os.sched_getaffinity(0))
+    start = (index * Config.TORCH_THREADS) % len(cores)
+    os.sched_setaffinity(0, {cores[(start + i) % len(cores)] for i in range(Config.TORCH_THREADS)})
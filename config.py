@@ -5,8 +5,13 @@ class Config:
     APP_URL = 'https://iris.chromesq.com'
     MAX_QUESTION_LENGTH = 100 # Maximum length of a question
     MAX_INTENT_LENGTH = 30 # Maximum length for intent name
+    INTENT_NAME_TERMS = 2  # Top TF-IDF terms after the page context in an intent name
+    INTENT_CLUSTERING = os.getenv('INTENT_CLUSTERING', 'true').lower() in ('true', '1', 'yes')
+    INTENT_CLUSTER_THRESHOLD = float(os.getenv('INTENT_CLUSTER_THRESHOLD', 0.8))  # Cosine similarity to share an intent
     MAX_UTTERANCE_LENGTH = 55 # Maximum length for utterances
-    MAX_BATCH_SIZE = 1 # Maximum number of questions to process in a single batch
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 8)) # Maximum number of sentences per generate call
+    BATCH_MEMORY_PER_SENTENCE = 96 * 1024 * 1024 # Estimated peak memory per sentence in a batch
+    MAX_INPUT_LENGTH = 512 # Maximum prompt length in tokens
     FALLBACK_MODE = True  # Enable fallback processing
     MIN_SENTENCES = 10  # Minimum sentences to process
     MAX_SENTENCES = 200 # Maximum number of sentences to generate
@@ -14,9 +19,22 @@ class Config:
     SCRAPING_MAX_DEPTH = int(os.getenv('SCRAPING_MAX_DEPTH', 3))
     SCRAPING_DELAY = float(os.getenv('SCRAPING_DELAY', 1.0))
     SCRAPING_DELAY_MAX = float(os.getenv('SCRAPING_DELAY_MAX', 1.5))  # Maximum delay for random backoff
+    CRAWL_MAX_IN_FLIGHT = int(os.getenv('CRAWL_MAX_IN_FLIGHT', 8))  # Concurrent downloads across all hosts
+    CRAWL_MAX_PER_HOST = int(os.getenv('CRAWL_MAX_PER_HOST', 4))  # Concurrent downloads per host
+    CRAWL_PARSE_WORKERS = int(os.getenv('CRAWL_PARSE_WORKERS', 2))  # Threads parsing downloaded pages
     REQUEST_TIMEOUT = (5, 15)  # (Connect timeout, Read timeout)
-    CACHE_ENABLED = os.getenv('CACHE_ENABLED', True)
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    HTTP_CACHE_DIRECTORY = os.getenv('HTTP_CACHE_DIRECTORY', 'cache/pages')
     CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 3600))  # 1 hour
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Generation cache
+    GENERATION_CACHE_BACKEND = os.getenv('GENERATION_CACHE_BACKEND', 'sqlite')  # sqlite, redis or none
+    GENERATION_CACHE_PATH = os.getenv('GENERATION_CACHE_PATH', 'cache/generation.sqlite3')
+    GENERATION_CACHE_TTL = int(os.getenv('GENERATION_CACHE_TTL', 30 * 86400))  # 30 days
+    GENERATION_CACHE_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', 100000))
+    GENERATION_CACHE_EVICT_INTERVAL = int(os.getenv('GENERATION_CACHE_EVICT_INTERVAL', 100))  # Inserts between size checks
+    GENERATION_CACHE_TOUCH_INTERVAL = int(os.getenv('GENERATION_CACHE_TOUCH_INTERVAL', 3600))  # Min seconds between accessed_at updates
     MIN_WORDS_PER_ELEMENT = 3  # Minimum words for a content element to be valid
     SYNCHRONOUS_THRESHOLD = 3
     SMALL_WEBSITE_THRESHOLD = 100000
@@ -36,6 +54,15 @@ class Config:
     # User agent for the bot
     USER_AGENT = 'Mozilla/5.0 (compatible; IrisBot/1.0; +https://iris.chromesq.com)'
     
+    # Model registry
+    MODEL_NAME = os.getenv('MODEL_NAME', 'google/flan-t5-large')
+    MODEL_DTYPE = os.getenv('MODEL_DTYPE', 'float32')
+    MODEL_DEVICE = 'cpu'
+    MODEL_PATH = os.getenv('MODEL_PATH')  # Local model directory, loaded with local_files_only
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')  # torch, torch_int8 or onnx
+    ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', 'models/onnx')  # Exported ONNX graphs are cached here, one subdirectory per model
+    MODEL_IDLE_TIMEOUT = int(os.getenv('MODEL_IDLE_TIMEOUT', 1800))  # Seconds before an unused model is evicted, -1 disables
+
     # Memory management
     TORCH_THREADS = 2 # Number of threads for PyTorch
     MEMORY_THRESHOLD = 0.8  # 80% memory usage threshold
@@ -43,12 +70,51 @@ class Config:
     MAX_CONTENT_LENGTH = 8 * 1024 * 1024  # 8 MB
     
     SYNC_REQUEST_TIMEOUT = 300
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    COALESCE_WINDOW = int(os.getenv('COALESCE_WINDOW', 600))  # Seconds a finished job is reused for identical requests
     ASYNC_REQUEST_TIMEOUT = 3600
     GENERATION_TIMEOUT = 299
+    TASK_TIME_LIMIT = 3600  # Celery hard-kills a task after this many seconds
+    DEADLINE_MARGIN = int(os.getenv('DEADLINE_MARGIN', 30))  # Seconds kept after generation to stop the crawl, name intents and save
+    DEFAULT_SENTENCE_COST = float(os.getenv('DEFAULT_SENTENCE_COST', 3.0))  # Seconds per sentence before any is measured
+    TIME_BUDGET_SAFETY = 0.8  # Share of the request timeout the sentence budget may use
+    RANKING_WINDOW = 64  # Sentences to rank together before the first batch is generated
 
     # Progressive Processing
     CONTENT_CHUNK_SIZE = 50000  # Process content in 50KB chunks
+    NLTK_DATA_PATHS = os.getenv(
+        'NLTK_DATA_PATHS', '/home/dev/nltk_data:/var/www/venv/nltk_data:/usr/share/nltk_data'
+    ).split(':')  # Searched in addition to NLTK's defaults; data is never downloaded at runtime
     MAX_CONTENT_PER_PAGE = 100000  # 100KB per page limit
     PROCESSING_BATCH_SIZE = 5  # Process 5 sentences at a time
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    SIMHASH_MAX_DISTANCE = 6  # Maximum differing bits for near-duplicate sentences, must stay below 8
+    PRODUCER_JOIN_TIMEOUT = 2  # Seconds main waits for the crawl to stop after generation ends
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 256))  # Sentences buffered between crawl and generation
+    
+    # Celery queues and worker pools
+    SPLIT_QUEUES = os.getenv('SPLIT_QUEUES', 'false').lower() in ('true', '1', 'yes')
+    SCRAPE_QUEUE = os.getenv('SCRAPE_QUEUE', 'scrape')
+    INFERENCE_QUEUE = os.getenv('INFERENCE_QUEUE', 'inference')
+    SYNC_QUEUE = os.getenv('SYNC_QUEUE', 'sync')  # Jobs a caller waits on; consumed only by workers that generate
+    SCRAPE_WORKER_POOL = os.getenv('SCRAPE_WORKER_POOL', 'threads')  # threads or gevent
+    SCRAPE_WORKER_CONCURRENCY = int(os.getenv('SCRAPE_WORKER_CONCURRENCY', 32))
+    INFERENCE_WORKER_CONCURRENCY = int(os.getenv('INFERENCE_WORKER_CONCURRENCY', 2))
+    WORKER_PRELOAD_MODEL = os.getenv('WORKER_PRELOAD_MODEL', 'true').lower() in ('true', '1', 'yes')  # Load and warm the model before forking
+    WORKER_READY_INTERVAL = 15  # Seconds between worker readiness heartbeats
+    INFERENCE_PIN_CORES = os.getenv('INFERENCE_PIN_CORES', 'true').lower() in ('true', '1', 'yes')
+    
+    # Sharded generation across workers
+    SHARDING_ENABLED = os.getenv('SHARDING_ENABLED', 'false').lower() in ('true', '1', 'yes')
+    SHARD_MIN_SENTENCES = 40  # Smaller sites are generated in a single task
+    SHARD_TARGET_COUNT = int(os.getenv('SHARD_TARGET_COUNT', 8))  # Shards per site when the queue is empty
+    SHARD_MIN_SIZE = 10
+    SHARD_MAX_SIZE = 100
     
-    OUTPUT_DIRECTORY = 'download'
\ No newline at end of file
+    OUTPUT_DIRECTORY = 'download'
+    RESULTS_PAGE_SIZE = 100  # Default page size for /results
+    RESULTS_MAX_PAGE_SIZE = 1000
+    EVENTS_HEARTBEAT = 15  # Seconds between keep-alive comments on /events
+    EVENTS_MAX_DURATION = int(os.getenv('EVENTS_MAX_DURATION', 3600))  # Clients reconnect after this
+    RESULTS_COMPRESS = os.getenv('RESULTS_COMPRESS', 'true').lower() in ('true', '1', 'yes')  # Store results as .ndjson.gz
+    MANIFEST_DIRECTORY = os.getenv('MANIFEST_DIRECTORY', 'manifests')  # Per-domain state for incremental runs
\ No newline at end of file
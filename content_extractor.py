@@ -0,0 +1,99 @@
+import hashlib
+import json
+from urllib.parse import urljoin
+from lxml import etree
+from lxml import html as lxml_html
+from config import Config
+
+CONTENT_TAGS = frozenset(Config.CONTENT_TAGS)
+EXCLUDED_ELEMENTS = frozenset(Config.EXCLUDED_ELEMENTS)
+EXCLUDED_CLASSES = frozenset(Config.EXCLUDED_CLASSES)
+EXCLUDED_IDS = frozenset(Config.EXCLUDED_IDS)
+
+# Bump when extract_page output changes; cached text from another version is re-parsed
+EXTRACTOR_VERSION = 2
+
+def get_extractor_version():
+    settings = json.dumps([
+        sorted(CONTENT_TAGS), sorted(EXCLUDED_ELEMENTS), sorted(EXCLUDED_CLASSES),
+        sorted(EXCLUDED_IDS), Config.MIN_WORDS_PER_ELEMENT
+    ])
+    return f"{EXTRACTOR_VERSION}:{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]}"
+
+def parse_html(markup):
+    if not markup or not markup.strip():
+        return None
+    try:
+        return lxml_html.fromstring(markup)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return lxml_html.fromstring(markup.encode('utf-8'))
+    except etree.ParserError:
+        return None
+
+def is_excluded(element):
+    if element.tag in EXCLUDED_ELEMENTS:
+        return True
+    classes = element.get('class')
+    if classes and not EXCLUDED_CLASSES.isdisjoint(classes.split()):
+        return True
+    return element.get('id') in EXCLUDED_IDS
+
+def extract_page(markup, page_url=''):
+    root = parse_html(markup)
+    if root is None:
+        return '', []
+
+    # Every content tag owns only the text that is not inside a nested content tag,
+    # so nested blocks are emitted once and in document order.
+    blocks = []
+    links = []
+    stack = [(root, None, False)]
+
+    while stack:
+        item, owner, is_text = stack.pop()
+        if is_text:
+            blocks[owner].append(item)
+            continue
+
+        element = item
+        tail = element.tail if owner is not None else None
+        if not isinstance(element.tag, str) or is_excluded(element):
+            if tail:
+                stack.append((tail, owner, True))
+            continue
+
+        element_owner = owner
+        if element.tag in CONTENT_TAGS:
+            element_owner = len(blocks)
+            blocks.append([])
+
+        if element.tag == 'a':
+            href = element.get('href')
+            if href:
+                links.append(urljoin(page_url, href))
+
+        if tail:
+            stack.append((tail, owner, True))
+        for child in reversed(element):
+            stack.append((child, element_owner, False))
+        if element.text and element_owner is not None:
+            stack.append((element.text, element_owner, True))
+
+    content = []
+    for fragments in blocks:
+        words = ''.join(fragments).split()
+        if len(words) > Config.MIN_WORDS_PER_ELEMENT:
+            content.append(' '.join(words))
+
+    return '\n'.join(content), links
+
+def extract_all_links(markup, page_url=''):
+    root = parse_html(markup)
+    if root is None:
+        return []
+    return [urljoin(page_url, href) for href in root.xpath('//a/@href')]
+
+# USAGE
+# text, links = extract_page('<article><p>Our store ships to every country worldwide.</p></article>')
+# print(text, links)
@@ -0,0 +1,125 @@
+import threading
+import time
+from config import Config
+from dedup import ContentDeduplicator
+from intents import cluster_intents, name_intents
+from manifest import content_hash
+from process_text import clean_sentence, extract_sentences
+from ranking import select_top_sentences
+from web_scraper import crawl_website, new_crawl_result
+
+class PipelineProgress:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.counts = {
+            "pages_fetched": 0,
+            "sentences_queued": 0,
+            "sentences_generated": 0,
+            "intents": 0
+        }
+
+    def update(self, stage, **counts):
+        with self.lock:
+            self.counts.update(counts)
+            snapshot = dict(self.counts, stage=stage)
+        if self.callback:
+            self.callback(snapshot)
+
+def put_until_stopped(sentence_pool, sentence, stop):
+    # Blocks while the pool is full so the crawl never runs far ahead of generation
+    while not stop.is_set():
+        if sentence_pool.put(sentence, timeout=0.5):
+            return True
+    return False
+
+def produce_sentences(url, single_page, crawl, sentence_pool, stop, progress, manifest=None, dedup=None, prefetched=None):
+    start_time = time.time()
+    pages = 0
+    queued = 0
+    try:
+        for page in crawl_website(url, single_page, crawl, prefetched, stop):
+            pages += 1
+            crawl["stats"]["total_words"] += len(page["text"].split())
+            progress.update("fetching content", pages_fetched=pages)
+
+            text = page["text"]
+            if manifest is not None:
+                fingerprint = content_hash(text)
+                unchanged = manifest.get_unchanged_sentences(page["url"], fingerprint)
+                if unchanged is not None:
+                    crawl["pages"][page["url"]] = {"fingerprint": fingerprint, "sentences": unchanged}
+                    crawl["stats"]["pages_unchanged"] += 1
+                    if dedup is not None:
+                        dedup.filter_blocks(text)
+                    continue
+
+            if dedup is not None:
+                text = dedup.filter_blocks(text)
+
+            hashes = []
+            for sentence in extract_sentences(text):
+                if dedup is not None and dedup.is_duplicate_sentence(sentence):
+                    continue
+
+                if manifest is not None:
+                    sentence_hash = content_hash(clean_sentence(sentence))
+                    hashes.append(sentence_hash)
+                    if manifest.has_entry(sentence_hash):
+                        crawl["stats"]["sentences_reused"] += 1
+                        continue
+
+                if not put_until_stopped(sentence_pool, sentence, stop):
+                    return
+                queued += 1
+
+            if manifest is not None:
+                crawl["pages"][page["url"]] = {"fingerprint": fingerprint, "sentences": hashes}
+            progress.update("processing content", sentences_queued=queued)
+    except Exception as e:
+        crawl["errors"].append(f"Error crawling {url}: {str(e)}")
+    finally:
+        crawl["stats"]["scraping_time"] = time.time() - start_time
+        sentence_pool.close()
+
+def merge_with_manifest(manifest, crawl, qa_pairs, stats):
+    generated = {content_hash(pair["answer"][0]): pair for pair in qa_pairs}
+    stats["entries_dropped"] = manifest.rebuild(dict(crawl["pages"]), generated, set(crawl["gone"]))
+    stats["sentences_generated"] = len(generated)
+    manifest.save()
+    return manifest.ordered_entries()
+
+def cluster_qa_pairs(qa_pairs, url, stats):
+    clustered = cluster_intents(qa_pairs, url)
+    stats["intents_merged"] = len(qa_pairs) - len(clustered)
+    return clustered
+
+def name_qa_pairs(qa_pairs, url, stats):
+    # Intents are named from one term matrix over the whole corpus, replacing the streamed per-batch names
+    if Config.INTENT_CLUSTERING:
+        return cluster_qa_pairs(qa_pairs, url, stats)
+    names = name_intents([' '.join(pair["answer"]) for pair in qa_pairs], url)
+    return [dict(pair, intent=name) for pair, name in zip(qa_pairs, names)]
+
+class SentenceList(list):
+    def put(self, sentence, timeout=None):
+        self.append(sentence)
+        return True
+
+    def close(self):
+        pass
+
+def collect_sentences(url, single_page=False, progress_callback=None, prefetched=None, budget=Config.MAX_SENTENCES):
+    crawl = new_crawl_result()
+    dedup = ContentDeduplicator() if Config.DEDUP_ENABLED else None
+    sentences = SentenceList()
+
+    produce_sentences(
+        url, single_page, crawl, sentences, threading.Event(),
+        PipelineProgress(progress_callback), dedup=dedup, prefetched=prefetched
+    )
+    if dedup is not None:
+        crawl["stats"].update(dedup.stats)
+
+    sentences = [s for s in sentences if len(s.split()) >= Config.MIN_WORDS_PER_ELEMENT]
+    return select_top_sentences(sentences, budget), crawl
@@ -0,0 +1,86 @@
+import hashlib
+import re
+from config import Config
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+_word_pattern = re.compile(r'\w+')
+
+def normalize_block(text):
+    return ' '.join(_word_pattern.findall(text.lower()))
+
+def hash_text(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+def simhash(text):
+    words = _word_pattern.findall(text.lower())
+    features = [' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        value = int.from_bytes(hash_text(feature), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+class ContentDeduplicator:
+    def __init__(self, max_distance=None):
+        self.max_distance = Config.SIMHASH_MAX_DISTANCE if max_distance is None else max_distance
+        self.block_hashes = set()
+        self.sentence_hashes = set()
+        self.bands = [{} for _ in range(SIMHASH_BANDS)]
+        self.stats = {
+            "boilerplate_blocks_dropped": 0,
+            "duplicate_sentences_dropped": 0,
+            "near_duplicate_sentences_dropped": 0
+        }
+
+    def filter_blocks(self, text):
+        # Blocks already seen on an earlier page of the crawl are template boilerplate
+        kept = []
+        for block in text.split('\n'):
+            key = hash_text(normalize_block(block))
+            if key in self.block_hashes:
+                self.stats["boilerplate_blocks_dropped"] += 1
+                continue
+            self.block_hashes.add(key)
+            kept.append(block)
+        return '\n'.join(kept)
+
+    def is_near_duplicate(self, fingerprint):
+        # With at most max_distance < SIMHASH_BANDS differing bits, one band must match exactly
+        for index, band in enumerate(self.bands):
+            for candidate in band.get(fingerprint >> (index * BAND_BITS) & BAND_MASK, ()):
+                if bin(candidate ^ fingerprint).count('1') <= self.max_distance:
+                    return True
+        return False
+
+    def is_duplicate_sentence(self, sentence):
+        normalized = normalize_block(sentence)
+        key = hash_text(normalized)
+        if key in self.sentence_hashes:
+            self.stats["duplicate_sentences_dropped"] += 1
+            return True
+
+        fingerprint = simhash(normalized)
+        if self.is_near_duplicate(fingerprint):
+            self.stats["near_duplicate_sentences_dropped"] += 1
+            return True
+
+        self.sentence_hashes.add(key)
+        for index, band in enumerate(self.bands):
+            band.setdefault(fingerprint >> (index * BAND_BITS) & BAND_MASK, []).append(fingerprint)
+        return False
+
+# USAGE
+# dedup = ContentDeduplicator()
+# text = dedup.filter_blocks(page_text)
+# sentences = [s for s in extract_sentences(text) if not dedup.is_duplicate_sentence(s)]
@@ -1,16 +1,19 @@
 import json
 
 from generate_utterances import generate_utterances
+from model_registry import use_model
 
 def generate_corpus(qa_pairs):
     corpus = []
-    for pair in qa_pairs:
-        utterances = generate_utterances(pair['question'])
-        corpus.append({
-            "intent": pair['intent'],
-            "utterances": utterances,
-            "answer": [pair['answer']]
-        })
+    # Hold a registry reference so the shared model stays loaded for the whole corpus
+    with use_model():
+        for pair in qa_pairs:
+            utterances = generate_utterances(pair['question'])
+            corpus.append({
+                "intent": pair['intent'],
+                "utterances": utterances,
+                "answer": [pair['answer']]
+            })
     return corpus
   
 # USAGE
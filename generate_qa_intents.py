@@ -1,131 +1,210 @@
 import torch
 import gc
-import re
-import signal
+import psutil
+import time
 from config import Config
-from transformers import pipeline
-from urllib.parse import urlparse
-from rake_nltk import Rake
+from generation_cache import cache_get, cache_set, make_cache_key
+from intents import name_intents
+from model_registry import use_model
+from process_text import clean_sentence
+from ranking import get_deadline, get_sentence_cost, plan_sentence_budget, record_generation_cost, select_top_sentences
+from transformers.modeling_outputs import BaseModelOutput
 
-_model = None
+def get_batch_size(requested):
+    memory = psutil.virtual_memory()
+    headroom = memory.total * Config.MEMORY_THRESHOLD - memory.used
+    affordable = int(headroom // Config.BATCH_MEMORY_PER_SENTENCE)
+    return max(1, min(requested, affordable))
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Generation task exceeded time limit")
+UTTERANCE_PROMPT = "Generate {num_variations} different frequently asked questions (FAQ's) from: {text}"
+UTTERANCE_TEMPERATURES = [0.6, 0.8, 0.9]
 
-def get_model():
-    global _model
-    if _model is None:
-        torch.cuda.empty_cache()
-        gc.collect()
-        _model = pipeline(
-            'text2text-generation',
-            model='google/flan-t5-large',
-            device='cpu',
-            model_kwargs={'low_cpu_mem_usage': True}
+def build_utterance_prompt(text, num_variations):
+    return UTTERANCE_PROMPT.format(num_variations=num_variations, text=text)
+
+def get_utterance_cache_key(text, num_variations):
+    return make_cache_key(text, Config.MODEL_NAME, UTTERANCE_PROMPT, {
+        "backend": Config.INFERENCE_BACKEND,
+        "num_variations": num_variations,
+        "temperatures": UTTERANCE_TEMPERATURES,
+        "max_length": Config.MAX_UTTERANCE_LENGTH
+    })
+
+def clean_utterance(text):
+    cleaned = clean_sentence(text)
+    if not cleaned.endswith('?'):
+        cleaned += '?'
+    if len(cleaned.split()) >= 3 and cleaned.isascii():
+        return cleaned
+    return None
+
+def generate_utterances_batch(texts, num_variations=5, stats=None):
+    if not texts:
+        return []
+
+    keys = [get_utterance_cache_key(text, num_variations) for text in texts]
+    results = [cache_get(key) for key in keys]
+    missing = [i for i, cached in enumerate(results) if cached is None]
+
+    if stats is not None:
+        stats["cache_hits"] = stats.get("cache_hits", 0) + len(texts) - len(missing)
+        stats["cache_misses"] = stats.get("cache_misses", 0) + len(missing)
+
+    if missing:
+        with use_model() as entry:
+            generated = sample_utterances(
+                entry.model,
+                entry.tokenizer,
+                [texts[i] for i in missing],
+                num_variations
+            )
+        for i, utterances in zip(missing, generated):
+            results[i] = utterances
+            cache_set(keys[i], utterances)
+
+    return results
+
+def sample_utterances(model, tokenizer, texts, num_variations):
+    prompts = [build_utterance_prompt(text, num_variations) for text in texts]
+    inputs = tokenizer(
+        prompts,
+        return_tensors='pt',
+        padding=True,
+        truncation=True,
+        max_length=Config.MAX_INPUT_LENGTH
+    )
+
+    with torch.inference_mode():
+        encoder_outputs = model.get_encoder()(
+            input_ids=inputs['input_ids'],
+            attention_mask=inputs['attention_mask']
         )
-    return _model
-
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s.,!?$€£¥%@#&*()\-]', '', text)
-    text = re.sub(r'\s+([.,!?])', r'\1', text)
-    text = re.sub(r'[\n\r\t]', ' ', text)
-    text = re.sub(r'([.,!?])\s+', r'\1 ', text)
-    text = text.replace('..', '.').replace(',,', ',')
-    return text.strip()
-
-def clean_intent_name(text):
-    text = re.sub(r'[\d_]+', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = text.lower().strip().replace(' ', '.')
-    text = re.sub(r'\.+$', '', text)
-    words = text.split('.')
-    if len(words) > 3:
-        words = words[:3]
-    return '.'.join(words)
-
-def generate_intent_name(text, url):
-    path = urlparse(url).path.strip('/')
-    page_context = path.split('/')[-1] if path else 'general'
-    
-    rake = Rake()
-    rake.extract_keywords_from_text(text)
-    keywords = rake.get_ranked_phrases()
-    topic = keywords[0] if keywords else 'general'
-    
-    intent_name = f"{page_context}.{topic}".lower().replace(' ', '_')
-    intent_name = clean_intent_name(intent_name)
-    return intent_name[:Config.MAX_INTENT_LENGTH]
 
-def generate_utterances(text, num_variations=5):
-    model = get_model()
-    text = clean_text(text)
-    
-    temperatures = [0.6, 0.8, 0.9]
-    utterances = set()
-    
-    for temp in temperatures:
-        prompt = f"Generate {num_variations} different frequently asked questions (FAQ's) from: {text}"
-        variations = model(
-            prompt,
-            max_length=Config.MAX_UTTERANCE_LENGTH,
-            num_return_sequences=num_variations,
-            temperature=temp,
-            do_sample=True,
+    utterances = [set() for _ in texts]
+
+    for temp in UTTERANCE_TEMPERATURES:
+        # Only sentences still short of num_variations are sampled again
+        pending = [i for i, found in enumerate(utterances) if len(found) < num_variations]
+        if not pending:
+            break
+
+        rows = torch.tensor(pending)
+        with torch.inference_mode():
+            outputs = model.generate(
+                encoder_outputs=BaseModelOutput(
+                    last_hidden_state=encoder_outputs.last_hidden_state[rows]
+                ),
+                attention_mask=inputs['attention_mask'][rows],
+                max_length=Config.MAX_UTTERANCE_LENGTH,
+                num_return_sequences=num_variations,
+                temperature=temp,
+                do_sample=True
+            )
+        decoded = tokenizer.batch_decode(
+            outputs,
+            skip_special_tokens=True,
             clean_up_tokenization_spaces=True
         )
-        
-        for var in variations:
-            cleaned = clean_text(var['generated_text'])
-            if not cleaned.endswith('?'):
-                cleaned += '?'
-            if len(cleaned.split()) >= 3 and cleaned.isascii():
-                utterances.add(cleaned)
-    
-    return list(utterances)[:num_variations]
-
-def generate_questions_and_intents(sentences, url, is_sync=False, batch_size=Config.MAX_BATCH_SIZE):
-    timeout = Config.SYNC_REQUEST_TIMEOUT if is_sync else Config.ASYNC_REQUEST_TIMEOUT
-    
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout)
-    
-    try:
-        sentences = [s for s in sentences if len(s.split()) >= Config.MIN_WORDS_PER_ELEMENT]
-        sentences = sentences[:Config.MAX_SENTENCES]
-        qa_pairs = []
-
-        torch.set_num_threads(Config.TORCH_THREADS)
+
+        # generate() returns num_variations consecutive sequences per input row
+        for index, generated in enumerate(decoded):
+            cleaned = clean_utterance(generated)
+            if cleaned:
+                utterances[pending[index // num_variations]].add(cleaned)
+
+    return [list(found)[:num_variations] for found in utterances]
+
+def generate_utterances(text, num_variations=5):
+    return generate_utterances_batch([clean_sentence(text)], num_variations)[0]
+
+def generate_batch(texts, url, stats=None):
+    qa_pairs = []
+    # Streamed results need a name now; the corpus pass over the final answers replaces it
+    for text, intent, utterances in zip(texts, name_intents(texts, url), generate_utterances_batch(texts, stats=stats)):
+        if utterances:
+            qa_pairs.append({
+                "intent": intent,
+                "utterances": utterances,
+                "answer": [text]
+            })
+    return qa_pairs
+
+def iter_sentence_batches(sentences, batch_size=Config.MAX_BATCH_SIZE):
+    batch = []
+    for sentence in sentences:
+        batch.append(sentence)
+        if len(batch) >= get_batch_size(batch_size):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def generate_from_batches(batches, url, is_sync=False, stats=None, progress_callback=None, deadline=None, on_pairs=None):
+    if deadline is None:
+        deadline = get_deadline(is_sync)
+    if stats is None:
+        stats = {}
+
+    qa_pairs = []
+    generated = 0
+    stats["deadline_reached"] = False
+
+    torch.set_num_threads(Config.TORCH_THREADS)
+    gc.collect()
+    torch.cuda.empty_cache() if torch.cuda.is_available() else None
+
+    for batch in batches:
+        texts = [
+            clean_sentence(text) for text in batch
+            if len(text.split()) >= Config.MIN_WORDS_PER_ELEMENT
+        ][:Config.MAX_SENTENCES - generated]
+        if not texts:
+            continue
+
+        # Stop before a batch that would overrun the deadline and keep what is already done
+        if time.time() + get_sentence_cost() * len(texts) > deadline:
+            stats["deadline_reached"] = True
+            break
+
+        batch_start = time.monotonic()
+        misses_before = stats.get("cache_misses", 0)
+        batch_pairs = generate_batch(texts, url, stats)
+        # Cache hits cost next to nothing, so only sentences the model generated update the estimate
+        misses = stats.get("cache_misses", 0) - misses_before
+        if misses:
+            record_generation_cost((time.monotonic() - batch_start) / misses)
+        qa_pairs.extend(batch_pairs)
+        if on_pairs and batch_pairs:
+            on_pairs(batch_pairs)
+        generated += len(texts)
+
+        if progress_callback:
+            progress_callback(sentences_generated=generated, intents=len(qa_pairs))
+
         gc.collect()
         torch.cuda.empty_cache() if torch.cuda.is_available() else None
 
-        for i in range(0, len(sentences), batch_size):
-            batch = sentences[i:i + batch_size]
-            
-            for text in batch:
-                text = clean_text(text)
-                intent_name = generate_intent_name(text, url)
-                utterances = generate_utterances(text)
-                
-                if utterances:
-                    qa_pairs.append({
-                        "intent": intent_name,
-                        "utterances": utterances,
-                        "answer": [text]
-                    })
-
-            gc.collect()
-            torch.cuda.empty_cache() if torch.cuda.is_available() else None
-
-        return qa_pairs
-    except TimeoutError:
-        return {
-            "status": "error",
-            "message": "Generation task exceeded time limit",
-            "error_type": "timeout"
-        }
-    finally:
-        signal.alarm(0) 
+        if generated >= Config.MAX_SENTENCES:
+            break
+
+    stats["sentences_attempted"] = generated
+    return qa_pairs
+
+def set_coverage(stats, available):
+    stats["sentences_available"] = available
+    attempted = stats.get("sentences_attempted", 0)
+    stats["coverage"] = round(attempted / available, 3) if available else 1.0
+
+def generate_questions_and_intents(sentences, url, is_sync=False, batch_size=Config.MAX_BATCH_SIZE, stats=None, deadline=None):
+    if stats is None:
+        stats = {}
+    sentences = [s for s in sentences if len(s.split()) >= Config.MIN_WORDS_PER_ELEMENT]
+    sentences = select_top_sentences(sentences, plan_sentence_budget(is_sync))
+    qa_pairs = generate_from_batches(
+        iter_sentence_batches(sentences, batch_size), url, is_sync, stats, deadline=deadline
+    )
+    set_coverage(stats, len(sentences))
+    return qa_pairs
         
 # USAGE
 # sentences = ["Your extracted sentences here..."]
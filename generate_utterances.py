@@ -1,36 +1,32 @@
-from transformers import pipeline
 import torch
 import gc
-
-# Global model instance
-_paraphrase_model = None
-
-def get_paraphrase_model():
-    global _paraphrase_model
-    if _paraphrase_model is None:
-        _paraphrase_model = pipeline(
-            'text2text-generation',
-            model='google/flan-t5-large',
-            device='cpu',
-            batch_size=1
-        )
-    return _paraphrase_model
+from config import Config
+from model_registry import use_model
 
 def generate_utterances(question):
     try:
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            
-        model = get_paraphrase_model()
-        paraphrases = model(
-            question,
-            num_return_sequences=3,
-            max_length=50,
-            clean_up_tokenization_spaces=True
-        )
+        with use_model() as entry:
+            inputs = entry.tokenizer(
+                question,
+                return_tensors='pt',
+                truncation=True,
+                max_length=Config.MAX_INPUT_LENGTH
+            )
+            with torch.inference_mode():
+                outputs = entry.model.generate(
+                    **inputs,
+                    num_beams=3,
+                    num_return_sequences=3,
+                    max_length=50
+                )
+            paraphrases = entry.tokenizer.batch_decode(
+                outputs,
+                skip_special_tokens=True,
+                clean_up_tokenization_spaces=True
+            )
         
         gc.collect()
-        return [p['generated_text'] for p in paraphrases]
+        return paraphrases
         
     except Exception as e:
         return [question]
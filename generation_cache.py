@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import Config
+from redis_client import get_redis
+
+_cache = None
+
+def make_cache_key(text, model_name, prompt_template, params):
+    payload = json.dumps({
+        "text": text,
+        "model": model_name,
+        "prompt": prompt_template,
+        "params": params
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SQLiteCache:
+    def __init__(self, path, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.inserts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS generations ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS generations_accessed_at ON generations (accessed_at)'
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value, created_at, accessed_at FROM generations WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.connection.execute('DELETE FROM generations WHERE key = ?', (key,))
+                self.connection.commit()
+                return None
+            # Recency only needs to be coarse for LRU, so hot keys are not rewritten on every hit
+            if now - row[2] > Config.GENERATION_CACHE_TOUCH_INTERVAL:
+                self.connection.execute(
+                    'UPDATE generations SET accessed_at = ? WHERE key = ?', (now, key)
+                )
+                self.connection.commit()
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO generations (key, value, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now)
+            )
+            self.inserts += 1
+            # The size bound is checked every few inserts and enforced only when it is exceeded
+            if self.inserts >= Config.GENERATION_CACHE_EVICT_INTERVAL:
+                self.inserts = 0
+                self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        size = self.connection.execute('SELECT COUNT(*) FROM generations').fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            # Least recently used rows go first
+            self.connection.execute(
+                'DELETE FROM generations WHERE key IN ('
+                'SELECT key FROM generations ORDER BY accessed_at LIMIT ?)',
+                (overflow,)
+            )
+
+class RedisCache:
+    prefix = 'iris:generation:'
+    index_key = 'iris:generation-lru'
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.client = get_redis()
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.client.zrem(self.index_key, key)
+            return None
+        self.client.zadd(self.index_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key, value):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        pipe.zadd(self.index_key, {key: time.time()})
+        pipe.zcard(self.index_key)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [k.decode('utf-8') for k, _ in self.client.zpopmin(self.index_key, overflow)]
+            self.client.delete(*[self.prefix + k for k in evicted])
+
+def get_generation_cache():
+    global _cache
+    if _cache is None:
+        backend = Config.GENERATION_CACHE_BACKEND
+        if backend == 'sqlite':
+            _cache = SQLiteCache(
+                Config.GENERATION_CACHE_PATH,
+                Config.GENERATION_CACHE_TTL,
+                Config.GENERATION_CACHE_MAX_ENTRIES
+            )
+        elif backend == 'redis':
+            _cache = RedisCache(Config.GENERATION_CACHE_TTL, Config.GENERATION_CACHE_MAX_ENTRIES)
+        else:
+            return None
+    return _cache
+
+def cache_get(key):
+    cache = get_generation_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        print(f"Generation cache read failed: {str(e)}")
+        return None
+
+def cache_set(key, value):
+    cache = get_generation_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(key, value)
+    except Exception as e:
+        print(f"Generation cache write failed: {str(e)}")
+
+# USAGE
+# key = make_cache_key("We ship worldwide.", "google/flan-t5-large", "{text}", {"num_variations": 5})
+# cache_set(key, ["Do you ship worldwide?"])
+# print(cache_get(key))
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from config import Config
+
+class PageCache:
+    def __init__(self, directory=None, timeout=None):
+        self.directory = directory or Config.HTTP_CACHE_DIRECTORY
+        self.timeout = Config.CACHE_TIMEOUT if timeout is None else timeout
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, url):
+        try:
+            with open(self.get_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, entry):
+        path = self.get_path(url)
+        # Write then rename so concurrent readers never see a half-written entry; each writer gets its own file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            # A page that parsed fine is still returned when it cannot be cached
+            print(f"Error caching {url}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('fetched_at', 0) < self.timeout
+
+    def touch(self, url, entry):
+        entry['fetched_at'] = time.time()
+        self.save(url, entry)
+
+def get_conditional_headers(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def get_page_cache():
+    if not Config.CACHE_ENABLED:
+        return None
+    try:
+        return PageCache()
+    except OSError as e:
+        print(f"HTTP cache disabled: {str(e)}")
+        return None
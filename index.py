@@ -1,16 +1,21 @@
 import os
-import requests
-import redis
-from flask import Flask, jsonify, request, send_from_directory
+import time
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from validators import url as validate_url
+from celery import uuid
+from celery.exceptions import TimeoutError as TaskTimeoutError
 from celery.result import AsyncResult
 from celery.states import PENDING, SUCCESS, FAILURE, STARTED, RETRY
 from urllib.parse import urlparse
 
+from celery_config import celery_app
 from config import Config
-from main import main
-from tasks import process_website_task
-from web_scraper import get_urls_to_process
+from job_registry import claim_job, get_job_key, is_dispatched, is_fresh, mark_dispatched, release_job
+from progress_events import format_event, iter_events, subscribe_events
+from results_store import find_output_file, iter_decompressed, load_result_items, read_result_page
+from tasks import dispatch_website_group, get_group_children, get_group_progress, process_website_task
+from web_scraper import FetchContext
+from worker_status import has_free_workers
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -26,22 +31,72 @@ def is_valid_url(url):
     normalized_url = normalize_input_url(url)
     return validate_url(normalized_url)
 
-def is_small_website(url):
-    try:
-        response = requests.get(url, timeout=Config.SYNCHRONOUS_THRESHOLD)
-        response.raise_for_status()
-        if response.content is not None:
-            content_length = len(response.content)
-        else:
-            content_length = 0
-        return content_length < Config.SMALL_WEBSITE_THRESHOLD
-    except Exception as e:
-        return False
-
 def is_absolute_path(url):
     parsed = urlparse(normalize_input_url(url))
     return bool(parsed.path) and parsed.path != '/' and not parsed.path.rstrip('/') == ''
 
+def is_reusable_job(task_id):
+    meta = celery_app.backend.get_task_meta(task_id)
+    state = meta.get('status', PENDING)
+    if state == SUCCESS:
+        info = meta.get('result')
+        return (
+            isinstance(info, dict)
+            and info.get('status') in ('complete', 'partial')
+            and is_fresh(meta.get('date_done'))
+        )
+    # A registered id the backend has no record of is still queued
+    return state in (PENDING, STARTED, RETRY)
+
+def register_job(urls, force=False, **options):
+    task_id = uuid()
+    job_key = None
+    created = True
+    if Config.COALESCE_ENABLED:
+        job_key = get_job_key(urls, **options)
+        task_id, created = claim_job(job_key, task_id, is_reusable_job, force)
+    if created:
+        mark_dispatched(task_id)
+    return job_key, task_id, created
+
+def get_processing_response(task_id, coalesced=False):
+    response = {
+        'task_id': task_id,
+        'status': 'processing',
+        'status_url': f'{Config.APP_URL}/status/{task_id}',
+        'events_url': f'{Config.APP_URL}/events/{task_id}'
+    }
+    if coalesced:
+        response['coalesced'] = True
+    return response
+
+def run_sync_job(task_id, args, kwargs=None):
+    # A free warm worker answers without this process ever loading a model; without one the job runs here
+    if has_free_workers():
+        # Its own queue, so the job never waits behind async jobs that can run for an hour
+        task = process_website_task.apply_async(args=args, kwargs=kwargs, task_id=task_id, queue=Config.SYNC_QUEUE)
+        return task.get(timeout=Config.SYNC_REQUEST_TIMEOUT)
+    return process_website_task.apply(args=args, kwargs=kwargs, task_id=task_id).get()
+
+def get_coalesced_response(task_id, wait=False):
+    # Both routes answer an attached job alike: its result with data once finished, 202 while it runs
+    meta = celery_app.backend.get_task_meta(task_id)
+    if meta.get('status') == SUCCESS:
+        result = meta.get('result')
+    elif wait:
+        try:
+            result = AsyncResult(task_id).get(timeout=Config.SYNC_REQUEST_TIMEOUT)
+        except TaskTimeoutError:
+            return jsonify(get_processing_response(task_id, coalesced=True)), 202
+    else:
+        return jsonify(get_processing_response(task_id, coalesced=True)), 202
+    return jsonify(dict(with_result_data(task_id, result), coalesced=True))
+
+def with_result_data(task_id, summary):
+    # Every sync answer names its job, so the caller can follow /events and /results like a coalesced one
+    output_file = find_output_file(task_id, summary.get('output_file')) if summary.get('output_file') else None
+    return dict(summary, task_id=task_id, data=load_result_items(output_file) if output_file else None)
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
@@ -52,6 +107,8 @@ def home():
 
 @app.route('/', methods=['POST'])
 def generate_corpus_route():
+    # The job's deadline counts from here, the moment the caller started waiting
+    started_at = time.time()
     try:
         data = request.get_json()
         if not data:
@@ -69,9 +126,23 @@ def generate_corpus_route():
         
         normalized_url = normalize_input_url(url) 
         single_page = is_absolute_path(url)
-            
-        result = main(normalized_url, single_page=single_page)
-        return jsonify(result)
+
+        job_key, task_id, created = register_job(
+            [normalized_url], bool(data.get('force', False)), single_page=single_page, incremental=False
+        )
+        if created:
+            try:
+                result = run_sync_job(
+                    task_id, [normalized_url, single_page], {'started_at': started_at, 'is_sync': True}
+                )
+            except TaskTimeoutError:
+                return jsonify(get_processing_response(task_id)), 202
+            except Exception:
+                release_job(job_key, task_id)
+                raise
+        else:
+            return get_coalesced_response(task_id, wait=True)
+        return jsonify(with_result_data(task_id, result))
         
     except Exception as e:
         return jsonify({
@@ -81,6 +152,7 @@ def generate_corpus_route():
 
 @app.route('/process', methods=['POST'])        
 def process_website():
+    started_at = time.time()
     try:
         data = request.get_json()
         if not data:
@@ -91,6 +163,9 @@ def process_website():
             
         url = data.get('url')
         url_list = data.get('urls') or []
+        incremental = bool(data.get('incremental', False))
+        sharded = bool(data.get('sharded', Config.SHARDING_ENABLED))
+        force = bool(data.get('force', False))
         
         if not isinstance(url_list, list):
             return jsonify({
@@ -98,7 +173,7 @@ def process_website():
                 "message": "The provided 'urls' must be a list"
             }), 400
         
-        if url_list and url:
+        if url_list:
             url_list = [url for url in url_list if is_valid_url(url)]
         elif url:
             url_list = [url] if is_valid_url(url) else []
@@ -110,38 +185,53 @@ def process_website():
             }), 400
         
         url_list = [normalize_input_url(url) for url in url_list]
-        
-        if url_list and len(url_list) > 1:
-            task = process_website_task.delay(url_list, single_page=False)
-            return jsonify({
-                'task_id': task.id,
-                'status': 'processing',
-                'status_url': f'{Config.APP_URL}/status/{task.id}'
-            })
-        else:  # Single URL case
-            single_page = is_absolute_path(url_list[0])
-            urls = get_urls_to_process(url_list[0], single_page)
-            
+        single_page = len(url_list) == 1 and is_absolute_path(url_list[0])
+
+        # Identical requests attach to the running or freshly finished job instead of starting another
+        job_key, task_id, created = register_job(url_list, force, single_page=single_page, incremental=incremental)
+        if not created:
+            # Whether the attached job is sync-sized is unknown here, so a running one is never waited on
+            return get_coalesced_response(task_id)
+
+        try:
+            if len(url_list) > 1:
+                dispatch_website_group(url_list, incremental, parent_id=task_id)
+                return jsonify(get_processing_response(task_id))
+
+            # Single URL case: the entry page is fetched once here and handed to the task
+            context = FetchContext(url_list[0], single_page).fetch()
+            urls = context.urls
             if not urls:
+                release_job(job_key, task_id)
                 return jsonify({
                     "status": "error",
                     "message": "No URLs found to process"
                 }), 400
-                
+
             total_urls = len(urls)
-            
-            if single_page or (total_urls <= Config.SYNCHRONOUS_THRESHOLD and is_small_website(url_list[0])):
+
+            if single_page or (total_urls <= Config.SYNCHRONOUS_THRESHOLD and context.is_small()):
                 # Synchronous processing
-                result = process_website_task.apply(args=[url_list[0], single_page])
-                return jsonify(result.get())
+                result = run_sync_job(
+                    task_id,
+                    [url_list[0], single_page, incremental],
+                    {'prefetched': context.prefetched, 'started_at': started_at, 'is_sync': True}
+                )
+                return jsonify(with_result_data(task_id, result))
             else:
                 # Asynchronous processing
-                task = process_website_task.delay(url_list[0], single_page)
-                return jsonify({
-                    'task_id': task.id,
-                    'status': 'processing',
-                    'status_url': f'{Config.APP_URL}/status/{task.id}'
-                })
+                process_website_task.apply_async(
+                    args=[url_list[0], single_page, incremental, sharded],
+                    kwargs={'prefetched': context.prefetched, 'started_at': started_at},
+                    task_id=task_id
+                )
+                return jsonify(get_processing_response(task_id))
+        except TaskTimeoutError:
+            # The worker keeps going; the client follows it like any async job
+            return jsonify(get_processing_response(task_id)), 202
+        except Exception:
+            release_job(job_key, task_id)
+            raise
         
     except Exception as e:
         return jsonify({
@@ -151,12 +241,23 @@ def process_website():
         
 @app.route('/status/<task_id>', methods=['GET'])
 def check_task_status(task_id):
-    redis_client = redis.Redis(host='localhost', port=6379, db=0)
     try:
-        task_result = AsyncResult(task_id)
-        task_key = f"celery-task-meta-{task_id}"
-        
-        if not redis_client.exists(task_key):
+        # One backend read per poll; the stored result is only a reference to the output file
+        meta = celery_app.backend.get_task_meta(task_id)
+        state = meta.get('status', PENDING)
+        info = meta.get('result')
+
+        # The backend reports PENDING both for queued ids and for ids it has no record of
+        group_progress = get_group_progress(task_id) if state == PENDING else None
+        if state == PENDING and group_progress is None and is_dispatched(task_id):
+            return {
+                "state": PENDING,
+                "status": "queued",
+                "task_id": task_id,
+                "status_url": f"{Config.APP_URL}/status/{task_id}",
+                "message": "This task is waiting for a worker."
+            }
+        if state == PENDING and group_progress is None:
             return {
                 "state": "NOT_FOUND",
                 "status": "task_not_found",
@@ -165,42 +266,46 @@ def check_task_status(task_id):
             }
             
         response = {
-            "state": task_result.state,
-            "status": task_result.state.lower(),
+            "state": state,
+            "status": state.lower(),
             "task_id": task_id,
             "status_url": f"{Config.APP_URL}/status/{task_id}"
         }
         
-        if task_result.state == PENDING:
+        if state == PENDING and group_progress:
             response.update({
-                'status': 'task pending',
-                'message': 'Task is in queue and waiting to be processed.'
+                'state': STARTED,
+                'status': group_progress['status'],
+                'sites': group_progress['sites'],
+                'sites_completed': group_progress['sites_completed'],
+                'progress': f"{group_progress['current']} / {group_progress['total']}",
+                'progress_percentage': int((group_progress['current'] / group_progress['total']) * 100)
             })
-        elif task_result.state == STARTED and task_result.info:
+        elif state == STARTED and isinstance(info, dict):
             response.update({
-                'status': task_result.info.get('status', ''),
-                'url': task_result.info.get('url'),
-                'progress': f"{task_result.info.get('current', 0)} / {task_result.info.get('total', 1)}",
-                'progress_percentage': int((task_result.info.get('current', 0) / task_result.info.get('total', 1)) * 100)
+                'status': info.get('status', ''),
+                'url': info.get('url'),
+                'progress': f"{info.get('current', 0)} / {info.get('total', 1)}",
+                'progress_percentage': int((info.get('current', 0) / info.get('total', 1)) * 100),
+                'results_url': f"{Config.APP_URL}/results/{task_id}"
             })
-        elif task_result.state == RETRY:
+        elif state == RETRY:
             response.update({
                 'status': 'task retrying',
                 'message': 'Task encountered an issue, It will be retried.'
             })
-        elif task_result.ready():
-            if task_result.successful():
-                response.update({
-                    "state": SUCCESS,
-                    "status": "completed",
-                    "result": task_result.get()
-                })
-            else:
-                response.update({
-                    "state": FAILURE,
-                    "status": "failed",
-                    "error": str(task_result.result)
-                })
+        elif state == SUCCESS:
+            response.update({
+                "state": SUCCESS,
+                "status": "completed",
+                "result": info
+            })
+        elif state == FAILURE:
+            response.update({
+                "state": FAILURE,
+                "status": "failed",
+                "error": str(info)
+            })
         
         return response
     
@@ -211,12 +316,114 @@ def check_task_status(task_id):
             "message": str(e)
         }
 
+def get_final_event(task_id):
+    meta = celery_app.backend.get_task_meta(task_id)
+    state = meta.get('status', PENDING)
+    if state == SUCCESS:
+        info = meta.get('result')
+        event = 'failed' if isinstance(info, dict) and info.get('status') == 'failed' else 'complete'
+        return event, dict(info or {}, task_id=task_id)
+    if state == FAILURE:
+        return 'failed', {'task_id': task_id, 'status': 'failed', 'error': str(meta.get('result'))}
+    return None
+
+@app.route('/events/<task_id>', methods=['GET'])
+def stream_task_events(task_id):
+    # Subscribe before reading the backend so nothing published in between is lost
+    pubsub = subscribe_events([task_id] + get_group_children(task_id))
+    meta = celery_app.backend.get_task_meta(task_id)
+    state = meta.get('status', PENDING)
+    queued = state == PENDING and is_dispatched(task_id)
+    if state == PENDING and not queued and get_group_progress(task_id) is None:
+        pubsub.close()
+        return jsonify({
+            "state": "NOT_FOUND",
+            "status": "task_not_found",
+            "task_id": task_id,
+            "message": "This task was not found. It may have expired or the provided task ID may be incorrect."
+        }), 404
+
+    def generate():
+        try:
+            final = get_final_event(task_id)
+            if final:
+                yield format_event(*final)
+                return
+            if state == STARTED and isinstance(meta.get('result'), dict):
+                yield format_event('progress', dict(meta['result'], task_id=task_id))
+            elif queued:
+                # Stay subscribed; the first progress event arrives when a worker starts the job
+                yield format_event('progress', {'task_id': task_id, 'status': 'queued'})
+            yield from iter_events(pubsub, task_id, lambda: get_final_event(task_id))
+        finally:
+            pubsub.close()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/results/<task_id>', methods=['GET'])
+def get_task_results(task_id):
+    try:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', Config.RESULTS_PAGE_SIZE, type=int), 1), Config.RESULTS_MAX_PAGE_SIZE)
+
+        info = celery_app.backend.get_task_meta(task_id).get('result')
+        filename = info.get('output_file') if isinstance(info, dict) else None
+        output_file = find_output_file(task_id, filename)
+        if not output_file:
+            return jsonify({
+                "status": "error",
+                "message": "Results are not available for this task yet"
+            }), 404
+
+        items, total = read_result_page(output_file, offset, limit)
+        response = {
+            "task_id": task_id,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "items": items
+        }
+        if offset + limit < total:
+            response["next_url"] = f"{Config.APP_URL}/results/{task_id}?offset={offset + limit}&limit={limit}"
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    if not os.path.exists(os.path.join('download', filename)):
+    filename = os.path.basename(filename)
+    output_dir = Config.OUTPUT_DIRECTORY
+    if os.path.exists(os.path.join(output_dir, filename)):
+        # conditional=True answers Range and If-None-Match requests
+        return send_from_directory(output_dir, filename, conditional=True)
+
+    compressed = os.path.join(output_dir, filename + '.gz')
+    if not os.path.exists(compressed):
         return jsonify({'error': 'File not found'}), 404
-    return send_from_directory('download', filename)
+
+    if 'gzip' in request.accept_encodings:
+        response = send_from_directory(
+            output_dir, filename + '.gz',
+            mimetype='application/x-ndjson',
+            conditional=True
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    # Clients without gzip support get the file decompressed on the fly
+    response = Response(stream_with_context(iter_decompressed(compressed)), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
     
 
 @app.route('/git', methods=['POST', 'GET'])
@@ -250,5 +457,5 @@ def method_not_allowed(error):
     }), 405
 
 if __name__ == '__main__':
-    os.makedirs('download', exist_ok=True)
+    os.makedirs(Config.OUTPUT_DIRECTORY, exist_ok=True)
     app.run(host='0.0.0.0', port=5000, debug=Config.DEBUG)
\ No newline at end of file
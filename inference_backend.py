@@ -0,0 +1,92 @@
+import hashlib
+import os
+import re
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+from config import Config
+
+BACKENDS = ('torch', 'torch_int8', 'onnx')
+
+def resolve_model_source(model_name):
+    # A local model directory keeps workers offline; the hub name is only a fallback
+    if Config.MODEL_PATH and model_name == Config.MODEL_NAME:
+        return Config.MODEL_PATH, True
+    return model_name, os.path.isdir(model_name)
+
+def load_tokenizer(source, local_only):
+    return AutoTokenizer.from_pretrained(source, local_files_only=local_only)
+
+def load_torch_model(source, local_only, dtype):
+    model = AutoModelForSeq2SeqLM.from_pretrained(
+        source,
+        torch_dtype=getattr(torch, dtype),
+        low_cpu_mem_usage=True,
+        local_files_only=local_only
+    )
+    model.eval()
+    return model
+
+def load_torch_int8_model(source, local_only):
+    model = load_torch_model(source, local_only, 'float32')
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def get_onnx_export_dir(model_name, source):
+    # One directory per model and source, so a changed MODEL_NAME never loads another model's graphs
+    origin = os.path.abspath(source) if os.path.isdir(source) else source
+    digest = hashlib.sha256(f"{model_name}\n{origin}".encode('utf-8')).hexdigest()[:12]
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '-', model_name).strip('-')
+    return os.path.join(Config.ONNX_MODEL_PATH, f"{slug}-{digest}")
+
+def load_onnx_model(model_name, source, local_only):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("The onnx backend requires: pip install optimum[onnxruntime]")
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = Config.TORCH_THREADS
+    session_options.inter_op_num_threads = 1
+
+    export_dir = get_onnx_export_dir(model_name, source)
+    if os.path.exists(os.path.join(export_dir, 'encoder_model.onnx')):
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            export_dir,
+            use_cache=True,
+            provider='CPUExecutionProvider',
+            session_options=session_options,
+            local_files_only=True
+        )
+
+    # First load exports encoder, decoder and decoder-with-past (KV cache) graphs once
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        source,
+        export=True,
+        use_cache=True,
+        provider='CPUExecutionProvider',
+        session_options=session_options,
+        local_files_only=local_only
+    )
+    os.makedirs(export_dir, exist_ok=True)
+    model.save_pretrained(export_dir)
+    return model
+
+def load_backend(backend, model_name, dtype, device, num_threads=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+
+    source, local_only = resolve_model_source(model_name)
+    tokenizer = load_tokenizer(source, local_only)
+
+    if backend == 'onnx':
+        return load_onnx_model(model_name, source, local_only), tokenizer
+
+    torch.set_num_threads(num_threads or Config.TORCH_THREADS)
+    if backend == 'torch_int8':
+        model = load_torch_int8_model(source, local_only)
+    else:
+        model = load_torch_model(source, local_only, dtype)
+    return model.to(device), tokenizer
+
+# USAGE
+# model, tokenizer = load_backend('torch_int8', 'google/flan-t5-large', 'float32', 'cpu')
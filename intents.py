@@ -0,0 +1,114 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+from urllib.parse import urlparse
+from config import Config
+from process_text import get_stop_words
+from ranking import build_tfidf
+
+def get_page_context(url):
+    path = urlparse(url).path.strip('/')
+    page = path.split('/')[-1] if path else ''
+    # "faq.html" or "About-Us" must not add segments or stray characters to the name
+    page = re.sub(r'\.[A-Za-z0-9]+$', '', page)
+    return re.sub(r'[^a-z]+', '', page.lower()) or 'general'
+
+def clean_intent_name(text):
+    text = re.sub(r'[\d_]+', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = text.lower().strip().replace(' ', '.')
+    text = re.sub(r'\.+', '.', text).strip('.')
+    words = text.split('.')
+    if len(words) > 3:
+        words = words[:3]
+    return '.'.join(words)
+
+def build_topic_vectors(texts):
+    tfidf, vocabulary = build_tfidf(texts)
+    # Stop words carry no topic, so they never name or link an intent
+    stop_words = get_stop_words()
+    vectors = [
+        {term: weight for term, weight in row.items() if weight > 0 and term not in stop_words}
+        for row in tfidf
+    ]
+    return vectors, vocabulary
+
+def name_from_vectors(vectors, vocabulary, url):
+    page_context = get_page_context(url)
+    names = []
+    for vector in vectors:
+        # Strongest terms first; ties go to the term that appeared first in the corpus
+        topic = heapq.nsmallest(
+            Config.INTENT_NAME_TERMS, vector, key=lambda term: (-vector[term], vocabulary[term])
+        )
+        name = clean_intent_name(' '.join([page_context] + (topic or ['general'])))
+        names.append(name[:Config.MAX_INTENT_LENGTH].rstrip('.'))
+    return names
+
+def name_intents(texts, url):
+    if not texts:
+        return []
+    vectors, vocabulary = build_topic_vectors(texts)
+    return name_from_vectors(vectors, vocabulary, url)
+
+def merge_unique(values):
+    seen = set()
+    merged = []
+    for value in values:
+        key = value.lower()
+        if key not in seen:
+            seen.add(key)
+            merged.append(value)
+    return merged
+
+def normalize_vector(vector):
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+def sum_vectors(vectors):
+    total = defaultdict(float)
+    for vector in vectors:
+        for term, weight in vector.items():
+            total[term] += weight
+    return total
+
+def cluster_intents(qa_pairs, url):
+    if len(qa_pairs) < 2:
+        return qa_pairs
+
+    vectors, vocabulary = build_topic_vectors([' '.join(pair["answer"]) for pair in qa_pairs])
+    units = [normalize_vector(vector) for vector in vectors]
+    # Each sentence is only compared with sentences sharing a term, never with the whole corpus at once
+    postings = defaultdict(list)
+    for i, unit in enumerate(units):
+        for term, weight in unit.items():
+            postings[term].append((i, weight))
+
+    # Greedy clustering in corpus order; each sentence joins the first intent close enough to it
+    assigned = [-1] * len(qa_pairs)
+    clusters = []
+    for i in range(len(qa_pairs)):
+        if assigned[i] >= 0:
+            continue
+        similarity = defaultdict(float)
+        for term, weight in units[i].items():
+            for j, other in postings[term]:
+                if assigned[j] < 0:
+                    similarity[j] += weight * other
+        members = sorted({i} | {j for j, value in similarity.items() if value >= Config.INTENT_CLUSTER_THRESHOLD})
+        for j in members:
+            assigned[j] = len(clusters)
+        clusters.append(members)
+
+    names = name_from_vectors(
+        [sum_vectors(vectors[i] for i in members) for members in clusters], vocabulary, url
+    )
+    merged = []
+    for name, members in zip(names, clusters):
+        merged.append({
+            "intent": name,
+            "utterances": merge_unique(u for i in members for u in qa_pairs[i]["utterances"]),
+            "answer": merge_unique(a for i in members for a in qa_pairs[i]["answer"])
+        })
+    return merged
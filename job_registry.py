@@ -0,0 +1,74 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from urllib.parse import urlparse, urlunparse
+from redis.exceptions import WatchError
+from config import Config
+from redis_client import get_redis
+
+def normalize_job_url(url):
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return urlunparse((parsed.scheme.lower(), host, parsed.path.rstrip('/'), '', parsed.query, ''))
+
+def get_job_key(urls, **options):
+    # Same site set plus the same options means the same job, whatever order the client used
+    job = {
+        'urls': sorted(normalize_job_url(url) for url in urls),
+        'options': options
+    }
+    digest = hashlib.sha256(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"iris:job:{digest}"
+
+def is_fresh(date_done):
+    if not date_done:
+        return False
+    if isinstance(date_done, str):
+        date_done = datetime.fromisoformat(date_done)
+    if date_done.tzinfo is None:
+        date_done = date_done.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - date_done).total_seconds() < Config.COALESCE_WINDOW
+
+def claim_job(job_key, task_id, is_reusable, force=False):
+    # Returns the task id to report and whether the caller must start it
+    redis_client = get_redis()
+    ttl = Config.ASYNC_REQUEST_TIMEOUT + Config.COALESCE_WINDOW
+    with redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(job_key)
+                existing = pipe.get(job_key)
+                if existing and not force:
+                    existing = existing.decode('utf-8')
+                    if is_reusable(existing):
+                        pipe.unwatch()
+                        return existing, False
+                pipe.multi()
+                pipe.set(job_key, task_id, ex=ttl)
+                pipe.execute()
+                return task_id, True
+            except WatchError:
+                # Another request claimed the key first; look again at what it registered
+                continue
+
+def get_dispatch_key(task_id):
+    return f"iris:dispatched:{task_id}"
+
+def mark_dispatched(task_id):
+    # Until a worker picks the task up the backend has no record of it; this tells queued from unknown
+    get_redis().set(get_dispatch_key(task_id), 1, ex=Config.ASYNC_REQUEST_TIMEOUT + Config.COALESCE_WINDOW)
+
+def is_dispatched(task_id):
+    return bool(get_redis().exists(get_dispatch_key(task_id)))
+
+def release_job(job_key, task_id):
+    redis_client = get_redis()
+    redis_client.delete(get_dispatch_key(task_id))
+    if job_key is None:
+        return
+    # Only the request that registered the task may drop it, so a newer claim survives
+    existing = redis_client.get(job_key)
+    if existing and existing.decode('utf-8') == task_id:
+        redis_client.delete(job_key)
@@ -1,9 +1,27 @@
+import threading
+import time
+from config import Config
+from crawl_pipeline import PipelineProgress, merge_with_manifest, name_qa_pairs, produce_sentences
+from dedup import ContentDeduplicator
 from generate_corpus import generate_corpus
-from generate_qa_intents import generate_questions_and_intents
-from process_text import extract_sentences
-from web_scraper import fetch_website_content
+from generate_qa_intents import generate_from_batches, get_batch_size, set_coverage
+from manifest import SiteManifest
+from ranking import RankedSentencePool, get_deadline, plan_sentence_budget
+from web_scraper import new_crawl_result
 
-def main(url, single_page=False):
+def iter_pool_batches(sentence_pool, deadline, stats, batch_size=Config.MAX_BATCH_SIZE):
+    while True:
+        # A slow crawl must not keep generation waiting past the deadline
+        batch = sentence_pool.get_batch(get_batch_size(batch_size), timeout=max(deadline - time.time(), 0))
+        if batch is None:
+            stats["deadline_reached"] = True
+            return
+        if not batch:
+            return
+        yield batch
+
+def main(url, single_page=False, progress_callback=None, incremental=False, result_writer=None, prefetched=None,
+         started_at=None, is_sync=None):
     result = {
         "status": "partial",
         "data": None,
@@ -11,36 +29,83 @@ def main(url, single_page=False):
         "url": url,
         "errors": []
     }
-    
+
+    if is_sync is None:
+        is_sync = single_page
+    started_at = started_at or time.time()
+    deadline = get_deadline(is_sync, started_at)
+    crawl = new_crawl_result()
+    manifest = None
+    if incremental:
+        manifest = SiteManifest.load(url)
+        crawl["pages"] = {}
+        crawl["stats"].update({"pages_unchanged": 0, "sentences_reused": 0})
+
+    dedup = ContentDeduplicator() if Config.DEDUP_ENABLED else None
+    progress = PipelineProgress(progress_callback)
+    budget = plan_sentence_budget(is_sync, time.time() - started_at)
+    sentence_pool = RankedSentencePool(Config.PIPELINE_QUEUE_SIZE, budget)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=produce_sentences,
+        args=(url, single_page, crawl, sentence_pool, stop, progress, manifest, dedup, prefetched),
+        daemon=True
+    )
+
     try:
-        scraped_content = fetch_website_content(url, single_page=single_page)
-        result["stats"] = scraped_content["stats"]
-        
-        if not scraped_content["content"]:
+        producer.start()
+        qa_pairs = generate_from_batches(
+            iter_pool_batches(sentence_pool, deadline, result["stats"]),
+            url,
+            is_sync=is_sync,
+            stats=result["stats"],
+            progress_callback=lambda **counts: progress.update("generating responses", **counts),
+            deadline=deadline,
+            # Incremental results are only final after the manifest merge, so they are written once below
+            on_pairs=result_writer.write if result_writer and not incremental else None
+        )
+        stop.set()
+        # The crawl notices stop within a poll interval; a download stuck past that is left to the daemon thread
+        producer.join(timeout=Config.PRODUCER_JOIN_TIMEOUT)
+        if producer.is_alive():
+            crawl["errors"].append("Crawl was still running when generation finished")
+        set_coverage(result["stats"], min(progress.counts["sentences_queued"], budget))
+
+        result["stats"].update(crawl["stats"])
+        if dedup is not None:
+            result["stats"].update(dedup.stats)
+        result["errors"].extend(crawl["errors"])
+
+        if manifest is not None and crawl["stats"]["pages_scraped"]:
+            qa_pairs = merge_with_manifest(manifest, crawl, qa_pairs, result["stats"])
+
+        if qa_pairs:
+            qa_pairs = name_qa_pairs(qa_pairs, url, result["stats"])
+        if result_writer and qa_pairs:
+            # The streamed file carries per-batch names, so the corpus-named result replaces it
+            result_writer.rewrite(qa_pairs)
+
+        if not crawl["stats"]["pages_scraped"]:
             result["status"] = "error"
             result["errors"].append("No content found")
-            return result
-            
-        sentences = extract_sentences(scraped_content["content"])
-        
-        if sentences:
-            qa_pairs = generate_questions_and_intents(sentences, url, is_sync=single_page)
-            if qa_pairs:
-                # corpus = generate_corpus(qa_pairs)
-                result["data"] = qa_pairs
-                result["status"] = "complete"
-            else:
-                result["errors"].append("No QA pairs generated")
-        else:
+        elif not progress.counts["sentences_queued"] and not qa_pairs:
             result["errors"].append("No sentences extracted")
-            
+        elif qa_pairs:
+            # corpus = generate_corpus(qa_pairs)
+            result["data"] = qa_pairs
+            # Work finished before the deadline is returned even when the rest was cut off
+            result["status"] = "partial" if result["stats"]["deadline_reached"] else "complete"
+        else:
+            result["errors"].append("No QA pairs generated")
+
     except Exception as e:
+        stop.set()
         result["status"] = "error"
         result["errors"].append(str(e))
-        
+
     return result
 
 # USAGE
 # url = 'https://example.com'
 # corpus = main(url)
-# print(corpus)
\ No newline at end of file
+# print(corpus)
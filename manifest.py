@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from urllib.parse import urlparse
+from config import Config
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def get_manifest_path(url):
+    domain = urlparse(url).netloc.replace('www.', '') or 'local'
+    return os.path.join(Config.MANIFEST_DIRECTORY, f"{domain}.json")
+
+class SiteManifest:
+    def __init__(self, path, data=None):
+        self.path = path
+        data = data or {}
+        self.pages = data.get("pages", {})
+        self.entries = data.get("entries", {})
+
+    @classmethod
+    def load(cls, url):
+        path = get_manifest_path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def get_unchanged_sentences(self, url, fingerprint):
+        page = self.pages.get(url)
+        if page and page["fingerprint"] == fingerprint:
+            return page["sentences"]
+        return None
+
+    def has_entry(self, sentence_hash):
+        return sentence_hash in self.entries
+
+    def rebuild(self, pages, generated, gone=()):
+        # Pages this run never reached keep their entries; only changed or removed pages lose content
+        merged_pages = {url: page for url, page in self.pages.items() if url not in gone}
+        merged_pages.update(pages)
+
+        entries = {}
+        for page in merged_pages.values():
+            complete = True
+            for sentence_hash in page["sentences"]:
+                entry = generated.get(sentence_hash) or self.entries.get(sentence_hash)
+                if entry is None:
+                    complete = False
+                elif sentence_hash not in entries:
+                    entries[sentence_hash] = entry
+            if not complete:
+                # Sentences cut by the budget or deadline get generated when the page is next crawled
+                page["fingerprint"] = None
+
+        dropped = len(set(self.entries) - set(entries))
+        self.pages = merged_pages
+        self.entries = entries
+        return dropped
+
+    def ordered_entries(self):
+        return list(self.entries.values())
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        # A temp file per writer, so concurrent runs for one domain never share a half-written file
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "updated_at": time.time(),
+                    "pages": self.pages,
+                    "entries": self.entries
+                }, f)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,133 @@
+import gc
+import os
+import threading
+import time
+import torch
+from contextlib import contextmanager
+from config import Config
+from inference_backend import load_backend
+
+_models = {}
+_lock = threading.RLock()
+_sweeper_pid = None
+
+class ModelEntry:
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.refs = 0
+        self.pinned = False
+        self.last_used = time.monotonic()
+
+def get_model_key(model_name=None, dtype=None, device=None, backend=None):
+    return (
+        model_name or Config.MODEL_NAME,
+        dtype or Config.MODEL_DTYPE,
+        device or Config.MODEL_DEVICE,
+        backend or Config.INFERENCE_BACKEND
+    )
+
+def load_model(model_name, dtype, device, backend, num_threads=None):
+    model, tokenizer = load_backend(backend, model_name, dtype, device, num_threads)
+    return ModelEntry(model, tokenizer)
+
+def acquire_model(model_name=None, dtype=None, device=None, backend=None, num_threads=None):
+    key = get_model_key(model_name, dtype, device, backend)
+    with _lock:
+        # The model about to be used is never evicted only to be loaded again
+        evict_idle_models(exclude=key)
+        entry = _models.get(key)
+        if entry is None:
+            gc.collect()
+            entry = load_model(*key, num_threads=num_threads)
+            _models[key] = entry
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+        return entry
+
+def release_model(model_name=None, dtype=None, device=None, backend=None):
+    key = get_model_key(model_name, dtype, device, backend)
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None:
+            entry.refs = max(0, entry.refs - 1)
+            entry.last_used = time.monotonic()
+            if entry.refs == 0:
+                start_idle_sweeper()
+
+@contextmanager
+def use_model(model_name=None, dtype=None, device=None, backend=None):
+    entry = acquire_model(model_name, dtype, device, backend)
+    try:
+        yield entry
+    finally:
+        release_model(model_name, dtype, device, backend)
+
+def evict_idle_models(max_idle=None, exclude=None):
+    if max_idle is None:
+        max_idle = Config.MODEL_IDLE_TIMEOUT
+    if max_idle < 0:
+        return 0
+
+    now = time.monotonic()
+    evicted = 0
+    with _lock:
+        for key, entry in list(_models.items()):
+            if key == exclude:
+                continue
+            if entry.refs == 0 and not entry.pinned and now - entry.last_used >= max_idle:
+                del _models[key]
+                evicted += 1
+
+    if evicted:
+        gc.collect()
+    return evicted
+
+def sweep_idle_models():
+    global _sweeper_pid
+    interval = max(1, min(Config.MODEL_IDLE_TIMEOUT, 60))
+    while True:
+        time.sleep(interval)
+        evict_idle_models()
+        with _lock:
+            if not any(not entry.pinned for entry in _models.values()):
+                _sweeper_pid = None
+                return
+
+def start_idle_sweeper():
+    # Frees idle models while the process waits for work; threads do not survive a fork, hence the pid
+    global _sweeper_pid
+    if Config.MODEL_IDLE_TIMEOUT < 0:
+        return
+    with _lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+    threading.Thread(target=sweep_idle_models, name='iris-model-sweeper', daemon=True).start()
+
+def run_warmup(entry):
+    inputs = entry.tokenizer("Warm up the model.", return_tensors='pt')
+    with torch.inference_mode():
+        entry.model.generate(**inputs, max_length=8)
+
+def warmup(model_name=None, dtype=None, device=None, backend=None):
+    with use_model(model_name, dtype, device, backend) as entry:
+        run_warmup(entry)
+    return entry
+
+def preload(model_name=None, dtype=None, device=None, backend=None):
+    # Runs in the worker parent before it forks. Loading and warmup stay on one thread so no
+    # OpenMP pool exists at fork time; children raise it to TORCH_THREADS on their first batch
+    entry = acquire_model(model_name, dtype, device, backend, num_threads=1)
+    # Children share these weights copy-on-write, so they must never evict and reload their own copy
+    entry.pinned = True
+    try:
+        run_warmup(entry)
+    finally:
+        release_model(model_name, dtype, device, backend)
+    return entry
+
+# USAGE
+# with use_model() as entry:
+#     inputs = entry.tokenizer("Can I get a refund?", return_tensors='pt')
+#     outputs = entry.model.generate(**inputs, max_length=50)
@@ -4,26 +4,52 @@ from config import Config
 from nltk.tokenize import sent_tokenize
 from nltk.corpus import stopwords
 
-nltk.data.path.extend([
-    '/home/dev/nltk_data',
-    '/var/www/venv/nltk_data',
-    '/usr/share/nltk_data'
-])
+nltk.data.path.extend(Config.NLTK_DATA_PATHS)
 
-nltk.download('punkt_tab', quiet=True)
-nltk.download('stopwords', quiet=True)
+NLTK_RESOURCES = {
+    'punkt_tab': 'tokenizers/punkt_tab/english/',
+    'stopwords': 'corpora/stopwords'
+}
+
+_stop_words = None
+
+def ensure_nltk_data():
+    # Data is installed at deploy time; nothing here touches the network
+    missing = []
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(package)
+    if missing:
+        raise RuntimeError(
+            f"Missing NLTK data: {', '.join(missing)}. "
+            f"Install it with: python -m nltk.downloader {' '.join(missing)} "
+            f"(searched {', '.join(nltk.data.path)})"
+        )
+
+def get_stop_words():
+    # Read the word list once per process instead of once per sentence
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = frozenset(stopwords.words('english'))
+    return _stop_words
+
+def is_meaningful_sentence(sentence, stop_words=None):
+    if stop_words is None:
+        stop_words = get_stop_words()
 
-def is_meaningful_sentence(sentence):
     words = sentence.split()
     if len(words) < Config.MIN_WORDS_PER_ELEMENT:
         return False
 
-    stop_words = set(stopwords.words('english'))
-    content_words = [w.lower() for w in words if w.lower() not in stop_words]
-    if len(content_words) < 2:
-        return False
-        
-    return True
+    content_words = 0
+    for word in words:
+        if word.lower() not in stop_words:
+            content_words += 1
+            if content_words >= 2:
+                return True
+    return False
 
 def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
@@ -35,25 +61,36 @@ def clean_text(text):
     text = text[0].upper() + text[1:] if text else text
     return text.strip()
 
-def extract_sentences(text, batch_size=1000):
-    sentences = []
-    paragraphs = text.split('\n')
-    for i in range(0, len(paragraphs), batch_size):
-        batch = paragraphs[i:i + batch_size]
-        batch_text = ' '.join(batch)
-        extracted = sent_tokenize(batch_text)
-        
-        meaningful_sentences = [
-            sent.strip() 
-            for sent in extracted 
-            if is_meaningful_sentence(sent)
-        ]
-        
-        sentences.extend(meaningful_sentences)
-    
-    return sentences
+def clean_sentence(text):
+    # Same cleanup as clean_text without capitalising; generated answers and manifest hashes use it
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\w\s.,!?$€£¥%@#&*()\-]', '', text)
+    text = re.sub(r'\s+([.,!?])', r'\1', text)
+    text = re.sub(r'[\n\r\t]', ' ', text)
+    text = re.sub(r'([.,!?])\s+', r'\1 ', text)
+    text = text.replace('..', '.').replace(',,', ',')
+    return text.strip()
+
+def iter_paragraphs(text):
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end < 0:
+            end = len(text)
+        if end > start:
+            yield text[start:end]
+        start = end + 1
+
+def extract_sentences(text):
+    stop_words = get_stop_words()
+    # Paragraphs are the extractor's content blocks, so no sentence spans two of them
+    for paragraph in iter_paragraphs(text):
+        for sentence in sent_tokenize(paragraph):
+            sentence = sentence.strip()
+            if is_meaningful_sentence(sentence, stop_words):
+                yield sentence
 
 # USAGE
 # text = "A sample token to test the functionality of this script. Let's get started."
-# sentences = extract_sentences(text)
+# sentences = list(extract_sentences(text))
 # print(sentences)
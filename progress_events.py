@@ -0,0 +1,57 @@
+import json
+import time
+from config import Config
+from redis_client import get_redis
+
+TERMINAL_EVENTS = ('complete', 'failed')
+
+def get_event_channel(task_id):
+    return f"iris:events:{task_id}"
+
+def publish_event(task_id, event, data):
+    # Progress is best effort; a Redis hiccup must never fail the job itself
+    try:
+        get_redis().publish(get_event_channel(task_id), json.dumps({'event': event, 'data': data}))
+    except Exception:
+        pass
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def subscribe_events(task_ids):
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*[get_event_channel(task_id) for task_id in task_ids])
+    return pubsub
+
+def iter_events(pubsub, task_id, check_finished=None):
+    # Yields SSE frames until the task itself finishes; other channels are forwarded with their id
+    deadline = time.monotonic() + Config.EVENTS_MAX_DURATION
+    last_sent = time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= Config.EVENTS_HEARTBEAT:
+                    last_sent = time.monotonic()
+                    # Tasks that die inside Celery publish nothing, so idle streams recheck the backend
+                    final = check_finished() if check_finished else None
+                    if final:
+                        yield format_event(*final)
+                        return
+                    yield ": keep-alive\n\n"
+                continue
+
+            channel = message['channel'].decode('utf-8')
+            payload = json.loads(message['data'])
+            source_id = channel[len(get_event_channel('')):]
+            data = dict(payload['data'], task_id=source_id)
+            last_sent = time.monotonic()
+
+            if source_id != task_id:
+                yield format_event('site_' + payload['event'], data)
+                continue
+            yield format_event(payload['event'], data)
+            if payload['event'] in TERMINAL_EVENTS:
+                return
+    finally:
+        pubsub.close()
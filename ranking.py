@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+from collections import Counter
+import numpy as np
+from config import Config
+
+_term_pattern = re.compile(r'[a-z][a-z0-9]{2,}')
+_cost_lock = threading.Lock()
+_sentence_cost = None
+
+def tokenize_terms(text):
+    return _term_pattern.findall(text.lower())
+
+def compute_idf(document_frequency, total_documents):
+    return np.log((1.0 + total_documents) / (1.0 + document_frequency)) + 1.0
+
+def build_tfidf(texts):
+    # Sparse rows of {term: weight}; vocabulary maps each term to the order it first appeared in
+    rows = [Counter(tokenize_terms(text)) for text in texts]
+    vocabulary = {}
+    document_frequency = Counter()
+    for row in rows:
+        for term in row:
+            vocabulary.setdefault(term, len(vocabulary))
+        document_frequency.update(row.keys())
+
+    idf = {term: compute_idf(df, len(texts)) for term, df in document_frequency.items()}
+    tfidf = []
+    for row in rows:
+        length = max(sum(row.values()), 1)
+        tfidf.append({term: count / length * idf[term] for term, count in row.items()})
+    return tfidf, vocabulary
+
+def score_sentences(texts, document_frequency=None, total_documents=None):
+    # Only per-sentence sums are needed, so they come from each sentence's term counts, never a matrix
+    rows = [Counter(tokenize_terms(text)) for text in texts]
+    if document_frequency is None:
+        document_frequency = Counter(term for row in rows for term in row)
+        total_documents = len(texts)
+
+    idf = {}
+    scores = np.zeros(len(texts), dtype=np.float32)
+    for i, row in enumerate(rows):
+        weight = 0.0
+        for term, count in row.items():
+            if term not in idf:
+                idf[term] = compute_idf(document_frequency.get(term, 0), total_documents)
+            weight += count * idf[term]
+        # Keyword density weighted by how many distinct content terms the sentence carries
+        scores[i] = weight / max(sum(row.values()), 1) * np.log1p(len(row))
+    return scores
+
+def select_top_sentences(sentences, limit):
+    if len(sentences) <= limit:
+        return list(sentences)
+    scores = score_sentences(sentences)
+    chosen = np.sort(np.argsort(-scores, kind='stable')[:limit])
+    return [sentences[i] for i in chosen]
+
+def record_generation_cost(seconds_per_sentence):
+    global _sentence_cost
+    with _cost_lock:
+        if _sentence_cost is None:
+            _sentence_cost = seconds_per_sentence
+        else:
+            _sentence_cost = 0.7 * _sentence_cost + 0.3 * seconds_per_sentence
+
+def get_sentence_cost():
+    return _sentence_cost or Config.DEFAULT_SENTENCE_COST
+
+def get_deadline(is_sync=False, started_at=None):
+    # Wall-clock time from when the request arrived, so it holds in whichever process runs the job
+    timeout = Config.SYNC_REQUEST_TIMEOUT if is_sync else min(Config.ASYNC_REQUEST_TIMEOUT, Config.TASK_TIME_LIMIT)
+    # The margin is left for the work after generation, before the caller or Celery gives up
+    return (started_at or time.time()) + timeout - Config.DEADLINE_MARGIN
+
+def plan_sentence_budget(is_sync=False, elapsed=0.0):
+    timeout = Config.SYNC_REQUEST_TIMEOUT if is_sync else Config.ASYNC_REQUEST_TIMEOUT
+    available = timeout * Config.TIME_BUDGET_SAFETY - elapsed
+    affordable = int(available / get_sentence_cost())
+    return max(Config.MIN_SENTENCES, min(Config.MAX_SENTENCES, affordable))
+
+class RankedSentencePool:
+    def __init__(self, maxsize, budget, window=None):
+        self.maxsize = maxsize
+        self.budget = budget
+        self.window = min(window or Config.RANKING_WINDOW, maxsize)
+        self.condition = threading.Condition()
+        self.pending = []
+        self.document_frequency = Counter()
+        self.total_documents = 0
+        self.taken = 0
+        self.closed = False
+
+    def put(self, sentence, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.pending) < self.maxsize, timeout):
+                return False
+            self.pending.append(sentence)
+            self.document_frequency.update(set(tokenize_terms(sentence)))
+            self.total_documents += 1
+            self.condition.notify_all()
+            return True
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_batch(self, batch_size, timeout=None):
+        with self.condition:
+            # Let a window of candidates build up so early hero text does not win by default
+            ready = self.condition.wait_for(lambda: self.closed or len(self.pending) >= self.window, timeout)
+            if not ready and not self.pending:
+                # Nothing arrived in time; None tells the caller apart from an exhausted pool
+                return None
+            remaining = self.budget - self.taken
+            if not self.pending or remaining <= 0:
+                return []
+
+            scores = score_sentences(self.pending, self.document_frequency, self.total_documents)
+            chosen = set(np.argsort(-scores, kind='stable')[:min(batch_size, remaining)].tolist())
+            batch = [s for i, s in enumerate(self.pending) if i in chosen]
+            self.pending = [s for i, s in enumerate(self.pending) if i not in chosen]
+            self.taken += len(batch)
+            self.condition.notify_all()
+            return batch
@@ -0,0 +1,10 @@
+import redis
+from config import Config
+
+_pool = None
+
+def get_redis():
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(Config.REDIS_URL)
+    return redis.Redis(connection_pool=_pool)
@@ -0,0 +1,98 @@
+import glob
+import gzip
+import json
+import os
+import zlib
+from urllib.parse import urlparse
+from config import Config
+
+def get_output_filename(url, job_id):
+    domain = urlparse(url).netloc.replace('www.', '') or 'local'
+    extension = 'ndjson.gz' if Config.RESULTS_COMPRESS else 'ndjson'
+    return f"{domain}-{job_id}.{extension}"
+
+def get_download_name(output_file):
+    name = os.path.basename(output_file)
+    return name[:-3] if name.endswith('.gz') else name
+
+def find_output_file(task_id, filename=None):
+    if filename:
+        path = os.path.join(Config.OUTPUT_DIRECTORY, os.path.basename(filename))
+        if os.path.exists(path):
+            return path
+    matches = glob.glob(os.path.join(Config.OUTPUT_DIRECTORY, f"*-{glob.escape(task_id)}.*"))
+    return matches[0] if matches else None
+
+def open_output(path, mode='rt'):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8' if 't' in mode else None)
+    return open(path, mode, encoding='utf-8' if 't' in mode else None)
+
+class ResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open_output(path, 'wb')
+
+    def write(self, items):
+        for item in items:
+            self.file.write(json.dumps(item).encode('utf-8') + b'\n')
+            self.count += 1
+        # A sync flush makes every completed line readable while the job is still running
+        if isinstance(self.file, gzip.GzipFile):
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            self.file.flush()
+
+    def rewrite(self, items):
+        # Readers holding the streamed file keep it; everyone opening the path afterwards sees the new corpus
+        self.close()
+        directory, name = os.path.split(self.path)
+        # The temporary name keeps the real suffix so it is written with the same compression
+        stem, extension = (name[:-3], '.gz') if name.endswith('.gz') else (name, '')
+        replacement = ResultWriter(os.path.join(directory, f".{stem}.tmp{extension}"))
+        try:
+            replacement.write(items)
+        finally:
+            replacement.close()
+        os.replace(replacement.path, self.path)
+        self.count = replacement.count
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+def iter_result_lines(path):
+    try:
+        with open_output(path) as f:
+            for line in f:
+                # A line without its newline is still being written
+                if line.endswith('\n') and line.strip():
+                    yield line
+    except EOFError:
+        # Gzip streams of running jobs have no end marker yet
+        return
+
+def read_result_page(path, offset=0, limit=None):
+    items = []
+    total = 0
+    for line in iter_result_lines(path):
+        if total >= offset and (limit is None or len(items) < limit):
+            items.append(json.loads(line))
+        total += 1
+    return items, total
+
+def load_result_items(path):
+    return read_result_page(path)[0]
+
+def iter_decompressed(path, chunk_size=64 * 1024):
+    try:
+        with gzip.open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    except EOFError:
+        return
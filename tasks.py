@@ -1,96 +1,345 @@
 import json
+import math
 import os
 import time
+from celery import chain, chord, uuid
+from celery.exceptions import Ignore
+from celery.states import PENDING, STARTED, SUCCESS
 from celery_config import celery_app
 from config import Config
-from main import main
-from urllib.parse import urlparse
+from progress_events import publish_event
+from redis_client import get_redis
+from results_store import ResultWriter, get_download_name, get_output_filename, iter_result_lines
 
-def get_output_filename(url, job_id):
-    domain = urlparse(url).netloc.replace('www.', '') or 'local'
-    return f"{domain}-{job_id}.json"
+def get_progress_meta(url, progress):
+    # Sentence generation is the long stage, so it drives current/total
+    total = min(progress.get("sentences_queued", 0), Config.MAX_SENTENCES)
+    return {
+        'status': progress.get("stage", ""),
+        'url': url,
+        'current': progress.get("sentences_generated", 0),
+        'total': max(total, 1),
+        'pages_fetched': progress.get("pages_fetched", 0),
+        'sentences_queued': progress.get("sentences_queued", 0),
+        'sentences_generated': progress.get("sentences_generated", 0),
+        'intents': progress.get("intents", 0)
+    }
+
+def report_state(task, job_id, url, progress):
+    # The backend keeps the latest state for /status; subscribers to /events get every update
+    meta = get_progress_meta(url, progress)
+    task.update_state(task_id=job_id, state='STARTED', meta=meta)
+    publish_event(job_id, 'progress', meta)
+
+def report_failure(job_id, url, error):
+    failure = {
+        'status': 'failed',
+        'error': str(error),
+        'url': url
+    }
+    publish_event(job_id, 'failed', failure)
+    return failure
+
+def get_result_reference(job_id, output_file):
+    return {
+        'output_file': os.path.basename(output_file),
+        'result_url': f"{Config.APP_URL}/download/{get_download_name(output_file)}",
+        'results_url': f"{Config.APP_URL}/results/{job_id}"
+    }
+
+def open_result_writer(url, job_id):
+    # Create filename with domain and task ID
+    return ResultWriter(os.path.join(Config.OUTPUT_DIRECTORY, get_output_filename(url, job_id)))
+
+def save_result(result, url, job_id, writer=None):
+    if writer is None:
+        writer = open_result_writer(url, job_id)
+        writer.write(result.get('data') or [])
+    writer.close()
+
+    # The result backend only keeps a reference; the corpus is served from the output file
+    summary = {
+        'url': url,
+        'status': result.get('status'),
+        'intents': writer.count,
+        'errors': result.get('errors', []),
+        'stats': result.get('stats', {})
+    }
+    summary.update(get_result_reference(job_id, writer.path))
+    publish_event(job_id, 'complete', summary)
+    return summary
+
+def get_shard_size(total):
+    # An idle queue gets many small shards; a backed-up queue gets fewer, larger ones
+    queue = Config.INFERENCE_QUEUE if Config.SPLIT_QUEUES else celery_app.conf.task_default_queue
+    depth = get_redis().llen(queue)
+    shard_count = max(1, Config.SHARD_TARGET_COUNT - depth)
+    size = math.ceil(total / shard_count)
+    return min(max(size, Config.SHARD_MIN_SIZE), Config.SHARD_MAX_SIZE)
 
 @celery_app.task(bind=True)
-def process_website_task(self, url, single_page=False):
-    steps = [
-        "setting up task",
-        "initializing models",
-        "fetching content",
-        "processing content",
-        "generating responses",
-        "saving results"
-    ]
-    total_steps = len(steps)
-    
+def process_website_task(self, url, single_page=False, incremental=False, sharded=False, prefetched=None,
+                         started_at=None, is_sync=None):
     try:
-        # Step 1: Create directory structure
-        self.update_state(
-            state='STARTED',
-            meta={
-                'status': steps[0],
-                'progress': f"1/{total_steps}",
-                'url': url
-            }
-        )
-        
-        # Create output directory
-        output_dir = Config.OUTPUT_DIRECTORY
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Create filename with domain and task ID
-        filename = get_output_filename(url, self.request.id)
-        
-        # Step 2: Initialize model
-        self.update_state(
-            state='STARTED',
-            meta={
-                'status': steps[1],
-                'progress': f"2/{total_steps}",
-                'url': url
-            }
-        )
-        
+        report_state(self, self.request.id, url, {"stage": "setting up task"})
+
         generation_start_time = time.time()
-        
-        # Step 3-5: Process using main function
-        self.update_state(
-            state='STARTED',
-            meta={
-                'status': steps[3],
-                'progress': f"3/{total_steps}",
-                'url': url
-            }
-        )
-        
-        result = main(url, single_page)
+        latest_progress = {}
+        if is_sync is None:
+            is_sync = single_page
+        started_at = started_at or generation_start_time
+
+        def report_progress(progress):
+            latest_progress.update(progress)
+            report_state(self, self.request.id, url, progress)
+
+        from ranking import get_deadline
+        # Both sides of a split run share the sync flag and one absolute deadline, so queue time counts
+        deadline = get_deadline(is_sync, started_at)
+
+        # Split and sharded runs need real workers and a plain crawl; incremental runs merge in-process.
+        # Sync jobs stay on the free sync worker that took them instead of queueing behind async work
+        if Config.SPLIT_QUEUES and not incremental and not is_sync and not self.request.is_eager:
+            raise self.replace(chain(
+                scrape_website_task.s(url, single_page, self.request.id, prefetched, is_sync, started_at),
+                generate_website_task.s(url, self.request.id, generation_start_time, sharded, is_sync, deadline)
+            ))
+        if sharded and not single_page and not incremental and not self.request.is_eager:
+            scraped = scrape_website(url, single_page, report_progress, prefetched, is_sync, started_at)
+            raise self.replace(
+                generate_website_task.s(scraped, url, self.request.id, generation_start_time, True, is_sync, deadline)
+            )
+
+        # Model and NLP modules load on first use so the API process never imports them
+        from main import main
+
+        writer = open_result_writer(url, self.request.id)
+        try:
+            result = main(
+                url,
+                single_page,
+                progress_callback=report_progress,
+                incremental=incremental,
+                result_writer=writer,
+                prefetched=prefetched,
+                started_at=started_at,
+                is_sync=is_sync
+            )
+        finally:
+            writer.close()
+
         # Add generation time to stats
         result['stats']['generation_time'] = time.time() - generation_start_time
         
-        # Step 6: Save results with new filename
-        self.update_state(
-            state='STARTED',
-            meta={
-                'status': steps[5],
-                'progress': f"6/{total_steps}",
-                'url': url
-            }
-        )
-        
-        output_file = os.path.join(output_dir, filename)
-        with open(output_file, 'w') as f:
-            json.dump(result, f, indent=4)
-            
-        return {
-            'url': url,
-            'data': result.get('data', {}),
-            'errors': result.get('errors', []),
-            'stats': result.get('stats', {}),
-            'result_url': f"{Config.APP_URL}/{output_file}"
-        }
+        report_state(self, self.request.id, url, dict(latest_progress, stage="saving results"))
+
+        return save_result(result, url, self.request.id, writer=writer)
         
+    except Ignore:
+        raise
+    except Exception as e:
+        return report_failure(self.request.id, url, e)
+
+def scrape_website(url, single_page=False, progress_callback=None, prefetched=None, is_sync=False, started_at=None):
+    from crawl_pipeline import collect_sentences
+    from ranking import plan_sentence_budget
+    budget = plan_sentence_budget(is_sync, time.time() - started_at if started_at else 0.0)
+    sentences, crawl = collect_sentences(url, single_page, progress_callback, prefetched, budget)
+    return {'sentences': sentences, 'crawl': crawl}
+
+@celery_app.task(bind=True)
+def scrape_website_task(self, url, single_page=False, job_id=None, prefetched=None, is_sync=False, started_at=None):
+    job_id = job_id or self.request.id
+    try:
+        return scrape_website(
+            url,
+            single_page,
+            lambda progress: report_state(self, job_id, url, progress),
+            prefetched,
+            is_sync,
+            started_at
+        )
     except Exception as e:
-        return {
-            'status': 'failed',
-            'error': str(e),
-            'url': url
-        }
+        # A failed result, not an exception, so chains and multi-site chords still complete
+        return report_failure(job_id, url, e)
+
+def generate_sentences(sentences, url, progress_callback=None, is_sync=False, deadline=None):
+    from generate_qa_intents import generate_from_batches, iter_sentence_batches
+    stats = {}
+    qa_pairs = generate_from_batches(
+        iter_sentence_batches(sentences),
+        url,
+        is_sync=is_sync,
+        stats=stats,
+        progress_callback=progress_callback,
+        deadline=deadline
+    )
+    return {'data': qa_pairs, 'stats': stats}
+
+@celery_app.task
+def generate_shard_task(sentences, url, is_sync=False, deadline=None):
+    try:
+        return generate_sentences(sentences, url, is_sync=is_sync, deadline=deadline)
+    except Exception as e:
+        # One lost shard leaves a partial result instead of failing the whole chord
+        return {'data': [], 'stats': {}, 'error': str(e)}
+
+@celery_app.task(bind=True)
+def generate_website_task(self, scraped, url, job_id, start_time, sharded=False, is_sync=False, deadline=None):
+    if scraped.get('status') == 'failed':
+        return scraped
+    try:
+        return generate_website(self, scraped, url, job_id, start_time, sharded, is_sync, deadline)
+    except Ignore:
+        raise
+    except Exception as e:
+        return report_failure(job_id, url, e)
+
+def generate_website(task, scraped, url, job_id, start_time, sharded=False, is_sync=False, deadline=None):
+    sentences, crawl = scraped['sentences'], scraped['crawl']
+
+    if sharded and len(sentences) >= Config.SHARD_MIN_SENTENCES:
+        shard_size = get_shard_size(len(sentences))
+        shards = [sentences[i:i + shard_size] for i in range(0, len(sentences), shard_size)]
+        crawl["stats"]["shards"] = len(shards)
+        report_state(task, job_id, url, {
+            "stage": f"generating responses in {len(shards)} shards",
+            "sentences_queued": len(sentences)
+        })
+        raise task.replace(chord(
+            [generate_shard_task.s(shard, url, is_sync, deadline) for shard in shards],
+            assemble_shards_task.s(url, crawl, len(sentences), job_id, start_time)
+        ))
+
+    def report_progress(**counts):
+        counts.update(stage="generating responses", sentences_queued=len(sentences))
+        report_state(task, job_id, url, counts)
+
+    shard = generate_sentences(sentences, url, report_progress, is_sync, deadline)
+    return assemble_shards_task([shard], url, crawl, len(sentences), job_id, start_time)
+
+def assemble_result(url, crawl, shard_results, available):
+    from generate_qa_intents import set_coverage
+    from crawl_pipeline import name_qa_pairs
+
+    # Chord results arrive in header order, so concatenation keeps the original sentence order
+    qa_pairs = [pair for shard in shard_results for pair in shard['data']]
+    stats = dict(crawl["stats"])
+    stats["deadline_reached"] = any(shard['stats'].get('deadline_reached') for shard in shard_results)
+    stats["sentences_attempted"] = sum(shard['stats'].get('sentences_attempted', 0) for shard in shard_results)
+    for key in ('cache_hits', 'cache_misses'):
+        stats[key] = sum(shard['stats'].get(key, 0) for shard in shard_results)
+    shard_errors = [f"Shard failed: {shard['error']}" for shard in shard_results if shard.get('error')]
+    set_coverage(stats, available)
+    if qa_pairs:
+        qa_pairs = name_qa_pairs(qa_pairs, url, stats)
+
+    result = {
+        "status": "complete",
+        "data": qa_pairs or None,
+        "stats": stats,
+        "url": url,
+        "errors": list(crawl["errors"]) + shard_errors
+    }
+    if not stats.get("pages_scraped"):
+        result["status"] = "error"
+        result["errors"].append("No content found")
+    elif not qa_pairs:
+        result["status"] = "partial"
+        result["errors"].append("No QA pairs generated")
+    elif stats["deadline_reached"] or shard_errors:
+        result["status"] = "partial"
+    return result
+
+@celery_app.task
+def assemble_shards_task(shard_results, url, crawl, available, job_id, start_time):
+    try:
+        result = assemble_result(url, crawl, shard_results, available)
+        result['stats']['generation_time'] = time.time() - start_time
+        return save_result(result, url, job_id)
+    except Exception as e:
+        return report_failure(job_id, url, e)
+
+
+def get_group_key(parent_id):
+    return f"iris:group:{parent_id}"
+
+@celery_app.task(bind=True)
+def merge_website_results_task(self, results, urls):
+    output_dir = Config.OUTPUT_DIRECTORY
+    extension = 'ndjson.gz' if Config.RESULTS_COMPRESS else 'ndjson'
+    writer = ResultWriter(os.path.join(output_dir, f"sites-{self.request.id}.{extension}"))
+
+    # Each site's file is streamed into the combined one line by line, so no corpus is held in memory
+    try:
+        for site in results:
+            if site.get('output_file'):
+                lines = iter_result_lines(os.path.join(output_dir, site['output_file']))
+                writer.write(dict(json.loads(line), url=site.get('url')) for line in lines)
+    finally:
+        writer.close()
+
+    failed = [r for r in results if r.get('status') == 'failed']
+    summary = {
+        'urls': urls,
+        'status': "partial" if failed else "complete",
+        'sites': results,
+        'stats': {
+            "sites": len(urls),
+            "sites_failed": len(failed),
+            "intents": writer.count
+        },
+        'errors': [f"{r.get('url')}: {r.get('error')}" for r in failed]
+    }
+    summary.update(get_result_reference(self.request.id, writer.path))
+    publish_event(self.request.id, 'complete', summary)
+    return summary
+
+def dispatch_website_group(urls, incremental=False, parent_id=None):
+    # The merge callback runs under the id handed to the client, so /status follows it
+    parent_id = parent_id or uuid()
+    child_ids = [uuid() for _ in urls]
+
+    redis_client = get_redis()
+    group_key = get_group_key(parent_id)
+    redis_client.rpush(group_key, *child_ids)
+    redis_client.expire(group_key, celery_app.conf.result_expires)
+
+    chord(
+        process_website_task.s(url, False, incremental).set(task_id=child_id)
+        for url, child_id in zip(urls, child_ids)
+    )(merge_website_results_task.s(urls).set(task_id=parent_id))
+    return parent_id
+
+def get_group_children(parent_id):
+    return [c.decode('utf-8') for c in get_redis().lrange(get_group_key(parent_id), 0, -1)]
+
+def get_task_metas(task_ids):
+    # One MGET for every id, where each AsyncResult attribute would be its own backend read
+    backend = celery_app.backend
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    return [backend.decode_result(value) if value else {'status': PENDING, 'result': None} for value in values]
+
+def get_group_progress(parent_id):
+    child_ids = get_group_children(parent_id)
+    if not child_ids:
+        return None
+
+    completed = 0
+    site_progress = 0.0
+    for meta in get_task_metas(child_ids):
+        state, info = meta.get('status'), meta.get('result')
+        if state == SUCCESS:
+            completed += 1
+            site_progress += 1
+        elif state == STARTED and isinstance(info, dict):
+            site_progress += info.get('current', 0) / max(info.get('total', 1), 1)
+
+    # Progress is counted in sites, with running sites contributing their completed share
+    return {
+        'status': 'processing sites',
+        'sites': len(child_ids),
+        'sites_completed': completed,
+        'current': round(site_progress, 2),
+        'total': len(child_ids)
+    }
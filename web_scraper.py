@@ -1,14 +1,19 @@
 import gc
+import random
 import requests
+import threading
 import time
 import psutil
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from urllib.parse import urljoin, urlparse, urlunparse
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from requests.exceptions import Timeout
 from urllib.robotparser import RobotFileParser
 from config import Config
+from content_extractor import extract_all_links, extract_page, get_extractor_version
+from http_cache import get_conditional_headers, get_page_cache
 
 def check_memory_usage():
     memory = psutil.virtual_memory()
@@ -35,7 +40,11 @@ def should_crawl_url(url, base_domain):
 def create_session():
     session = requests.Session()
     retry = Retry(connect=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=Config.CRAWL_MAX_IN_FLIGHT,
+        pool_maxsize=Config.CRAWL_MAX_IN_FLIGHT
+    )
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     session.headers.update({
@@ -46,59 +55,153 @@ def create_session():
     })
     return session
 
+class FetchContext:
+    # Fetches the entry page once per request and shares it between routing and the crawl
+    def __init__(self, url, single_page=False):
+        self.url = normalize_url(url)
+        self.single_page = single_page
+        self.page = None
+        self.content_length = None
+        self.all_links = []
+
+    def fetch(self):
+        try:
+            page, _ = fetch_page(create_session(), self.url, Config.REQUEST_TIMEOUT, get_page_cache())
+        except Exception as e:
+            print(f"Error fetching {self.url}: {str(e)}")
+            return self
+        if page is not None:
+            self.page = page
+            self.content_length = page.get("content_length", len(page["body"].encode('utf-8')))
+            # Routing counts every anchor on the page, not only those inside content blocks
+            self.all_links = extract_all_links(page["body"], self.url)
+        return self
+
+    @property
+    def urls(self):
+        urls = {self.url}
+        if self.single_page or self.page is None:
+            return list(urls)
+
+        base_domain = urlparse(self.url).netloc
+        for link in self.all_links:
+            normalized_url = normalize_url(link)
+            if urlparse(normalized_url).netloc == base_domain:
+                urls.add(normalized_url)
+        return list(urls)
+
+    def is_small(self):
+        return self.content_length is not None and self.content_length < Config.SMALL_WEBSITE_THRESHOLD
+
+    @property
+    def prefetched(self):
+        # Only what the crawl needs travels with the task, not the raw markup
+        if self.page is None:
+            return None
+        return {"url": self.url, "text": self.page["text"], "links": self.page["links"]}
+
 def get_urls_to_process(base_url, single_page=False):
-    session = create_session()
-    urls = {normalize_url(base_url)}
-    
     if single_page:
-        return list(urls)
-        
-    try:
-        response = session.get(base_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        base_domain = urlparse(base_url).netloc
-        
-        for link in soup.find_all('a'):
-            href = link.get('href')
-            if href:
-                full_url = urljoin(base_url, href)
-                normalized_url = normalize_url(full_url)
-                if urlparse(normalized_url).netloc == base_domain:
-                    urls.add(normalized_url)
-                    
-                if check_memory_usage() > 0.9:
-                    gc.collect()
+        return [normalize_url(base_url)]
+    return FetchContext(base_url).fetch().urls
+
+class HostThrottle:
+    def __init__(self, max_in_flight, crawl_delay=None):
+        self.max_in_flight = max_in_flight
+        self.crawl_delay = crawl_delay or 0
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.next_request_at = {}
+
+    def get_delay(self):
+        return max(self.crawl_delay, random.uniform(Config.SCRAPING_DELAY, Config.SCRAPING_DELAY_MAX))
+
+    @contextmanager
+    def slot(self, host):
+        with self.lock:
+            semaphore = self.slots.setdefault(host, threading.BoundedSemaphore(self.max_in_flight))
+
+        semaphore.acquire()
+        try:
+            # Request start times on a host are spaced by the politeness delay
+            with self.lock:
+                now = time.monotonic()
+                start = max(now, self.next_request_at.get(host, now))
+                self.next_request_at[host] = start + self.get_delay()
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            semaphore.release()
+
+def download_page(session, url, timeout, page_cache=None, throttle=None):
+    entry = page_cache.load(url) if page_cache else None
+    if entry and not entry.get("body"):
+        entry = None
+    if entry and page_cache.is_fresh(entry):
+        return entry, 'cached'
+
+    with throttle.slot(urlparse(url).netloc) if throttle else nullcontext():
+        response = session.get(
+            url,
+            timeout=timeout,
+            allow_redirects=True,
+            stream=True,
+            headers=get_conditional_headers(entry) if entry else None
+        )
+
+        if response.status_code == 304 and entry:
+            response.close()
+            page_cache.touch(url, entry)
+            return entry, 'revalidated'
+
+        response.raise_for_status()
+
+        if 'text/html' not in response.headers.get('Content-Type', ''):
+            response.close()
+            return None, 'skipped'
+
+        # Process content in chunks
+        body = ""
+        content_size = 0
+        content_length = response.headers.get('Content-Length')
+        for chunk in response.iter_content(chunk_size=Config.CONTENT_CHUNK_SIZE):
+            if chunk:
+                body += chunk.decode('utf-8', errors='ignore')
+                content_size += len(chunk)
+
+                if content_size >= Config.MAX_CONTENT_PER_PAGE:
                     break
-                    
-    except Exception as e:
-        print(f"Error collecting URLs from {base_url}: {str(e)}")
-        
-    return list(urls)
-
-def parse_website_content(soup):
-    # Remove unwanted elements
-    for element in soup.find_all(Config.EXCLUDED_ELEMENTS):
-        element.decompose()
-
-    # Remove elements with specific classes or IDs
-    for element in soup.find_all(class_=Config.EXCLUDED_CLASSES):
-        element.decompose()
-    
-    for element in soup.find_all(id=Config.EXCLUDED_IDS):
-        element.decompose()
+        response.close()
+
+    return {
+        "url": url,
+        "etag": response.headers.get('ETag'),
+        "last_modified": response.headers.get('Last-Modified'),
+        "fetched_at": time.time(),
+        "content_length": int(content_length) if content_length and content_length.isdigit() else content_size,
+        "body": body
+    }, 'fetched'
+
+def needs_parse(page, source):
+    # Cached text from an older extractor is rebuilt from the stored body
+    return source == 'fetched' or page.get("extractor") != get_extractor_version()
 
-    # Extract content from specific tags
-    content_tags = Config.CONTENT_TAGS
-    content = []
-    for tag in content_tags:
-        elements = soup.find_all(tag)
-        for element in elements:
-            text = ' '.join(element.get_text().split())
-            if text and len(text.split()) > Config.MIN_WORDS_PER_ELEMENT:
-                content.append(text)
+def parse_page(page, page_cache=None):
+    text, links = extract_page(page["body"], page["url"])
+    page["extractor"] = get_extractor_version()
+    page["text"] = text
+    page["links"] = [normalize_url(link) for link in links]
 
-    return ' '.join(content)
+    if page_cache:
+        page_cache.save(page["url"], page)
+    return page
 
+def fetch_page(session, url, timeout, page_cache=None, throttle=None):
+    page, source = download_page(session, url, timeout, page_cache, throttle)
+    if page is not None and needs_parse(page, source):
+        page = parse_page(page, page_cache)
+    return page, source
 
 def process_batch(urls):
     session = create_session()
@@ -109,87 +212,132 @@ def process_batch(urls):
         results.append(result)
     return results
 
-def fetch_website_content(url, single_page=False):
-    result = {
+def read_robots(url, result):
+    rp = RobotFileParser()
+    robots_url = urljoin(url, '/robots.txt')
+    try:
+        rp.set_url(robots_url)
+        rp.read()
+    except Exception as e:
+        result["errors"].append(f"Failed to read robots.txt: {str(e)}")
+        # None indicates robots.txt is not available
+        return None
+    return rp
+
+def get_crawl_delay(rp):
+    if rp is None:
+        return None
+    try:
+        return rp.crawl_delay(Config.USER_AGENT) or rp.crawl_delay('*')
+    except Exception:
+        return None
+
+def new_crawl_result():
+    return {
         "content": "",
         "stats": {
             "pages_scraped": 0,
             "total_words": 0,
             "scraping_time": 0,
-            "memory_usage": 0
+            "memory_usage": 0,
+            "pages_from_cache": 0,
+            "pages_revalidated": 0
         },
+        "gone": [],
         "errors": []
     }
-    
-    start_time = time.time()
+
+def crawl_website(url, single_page=False, result=None, prefetched=None, stop=None):
+    if result is None:
+        result = new_crawl_result()
+
     session = create_session()
-    
-    visited_urls = set()
-    urls_to_visit = {normalize_url(url)}
+    page_cache = get_page_cache()
+    timeout = Config.SYNC_REQUEST_TIMEOUT if single_page else Config.ASYNC_REQUEST_TIMEOUT
     base_domain = urlparse(url).netloc
-    content_size = 0
-    
-    # Initialize robots.txt parser
-    rp = RobotFileParser()
-    robots_url = urljoin(url, '/robots.txt')
+    max_pages = 1 if single_page else Config.MAX_PAGES
+
+    rp = read_robots(url, result)
+    throttle = HostThrottle(Config.CRAWL_MAX_PER_HOST, get_crawl_delay(rp))
+
+    visited_urls = set()
+    scheduled_urls = set()
+    urls_to_visit = [normalize_url(url)]
+    pending = {}
+
+    network = ThreadPoolExecutor(max_workers=Config.CRAWL_MAX_IN_FLIGHT)
+    parsers = ThreadPoolExecutor(max_workers=Config.CRAWL_PARSE_WORKERS)
+
+    def downloads_in_flight():
+        return sum(1 for stage, _ in pending.values() if stage == 'download')
+
     try:
-        rp.set_url(robots_url)
-        rp.read()
-    except Exception as e:
-        result["errors"].append(f"Failed to read robots.txt: {str(e)}")
-        # Set rp to None to indicate robots.txt is not available
-        rp = None
-    
-    while urls_to_visit and len(visited_urls) < Config.MAX_PAGES:
-        current_url = urls_to_visit.pop()
-        
-        if current_url in visited_urls:
-            continue
-            
-        if rp is not None and not is_allowed_to_crawl(current_url, rp):
-            result["errors"].append(f"URL not allowed by robots.txt: {current_url}")
-            continue
-            
-        try:
-            response = session.get(
-                current_url, 
-                timeout=Config.SYNC_REQUEST_TIMEOUT if single_page else Config.ASYNC_REQUEST_TIMEOUT,                allow_redirects=True,
-                stream=True
-            )
-            response.raise_for_status()
-            
-            if 'text/html' not in response.headers.get('Content-Type', ''):
-                continue
-
-            # Process content in chunks
-            content_chunk = ""
-            for chunk in response.iter_content(chunk_size=Config.CONTENT_CHUNK_SIZE):
-                if chunk:
-                    content_chunk += chunk.decode('utf-8', errors='ignore')
-                    content_size += len(chunk)
-                    
-                    if content_size >= Config.MAX_CONTENT_PER_PAGE:
-                        break
-            
-            soup = BeautifulSoup(content_chunk, 'html.parser')
-            processed_content = parse_website_content(soup)
-            
-            if processed_content:
-                result["content"] += processed_content + " "
-                visited_urls.add(current_url)
-                result["stats"]["pages_scraped"] += 1
-            
-            # Progressive URL collection
-            if not single_page:
-                for link in soup.find_all('a'):
-                    href = link.get('href')
-                    if href:
-                        absolute_url = urljoin(current_url, href)
-                        normalized_url = normalize_url(absolute_url)
-                        if (should_crawl_url(normalized_url, base_domain) and 
-                            normalized_url not in visited_urls):
-                            urls_to_visit.add(normalized_url)
-            
+        while stop is None or not stop.is_set():
+            # Only schedule as many downloads as could still fill the page budget
+            while (urls_to_visit and
+                   downloads_in_flight() < Config.CRAWL_MAX_IN_FLIGHT and
+                   len(visited_urls) + len(pending) < max_pages):
+                current_url = urls_to_visit.pop(0)
+                if current_url in scheduled_urls:
+                    continue
+                scheduled_urls.add(current_url)
+
+                if rp is not None and not is_allowed_to_crawl(current_url, rp):
+                    result["errors"].append(f"URL not allowed by robots.txt: {current_url}")
+                    continue
+
+                if prefetched and current_url == prefetched["url"]:
+                    # The API already downloaded and parsed the entry page for this request
+                    future = Future()
+                    future.set_result(prefetched)
+                    pending[future] = ('parse', current_url)
+                    continue
+
+                future = network.submit(download_page, session, current_url, timeout, page_cache, throttle)
+                pending[future] = ('download', current_url)
+
+            if not pending:
+                break
+
+            # Wake up regularly so a stopped run never waits out a slow download
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, current_url = pending.pop(future)
+                try:
+                    if stage == 'download':
+                        page, source = future.result()
+                        if page is None:
+                            continue
+                        if source == 'cached':
+                            result["stats"]["pages_from_cache"] += 1
+                        elif source == 'revalidated':
+                            result["stats"]["pages_revalidated"] += 1
+                        if needs_parse(page, source):
+                            # Parsing runs on its own pool so slow pages never hold a network slot
+                            pending[parsers.submit(parse_page, page, page_cache)] = ('parse', current_url)
+                            continue
+                    else:
+                        page = future.result()
+                except Exception as e:
+                    # Only a definite 404/410 means the page is gone; other failures may be transient
+                    status = getattr(getattr(e, 'response', None), 'status_code', None)
+                    if status in (404, 410):
+                        result["gone"].append(current_url)
+                    result["errors"].append(f"Error scraping {current_url}: {str(e)}")
+                    continue
+
+                if page["text"] and len(visited_urls) < max_pages:
+                    visited_urls.add(current_url)
+                    result["stats"]["pages_scraped"] += 1
+                    yield page
+
+                # Progressive URL collection
+                if not single_page:
+                    for normalized_url in page["links"]:
+                        if (should_crawl_url(normalized_url, base_domain) and
+                                normalized_url not in scheduled_urls):
+                            urls_to_visit.append(normalized_url)
+
             # Memory management
             current_memory = check_memory_usage()
             result["stats"]["memory_usage"] = current_memory
@@ -197,19 +345,21 @@ def fetch_website_content(url, single_page=False):
                 gc.collect()
                 result["errors"].append("Memory usage threshold reached")
                 break
-                
-        except Exception as e:
-            result["errors"].append(f"Error scraping {current_url}: {str(e)}")
-            continue
-        
-        # time.sleep(Config.SCRAPING_DELAY)
-            
-        if single_page:
-            break
-    
+    finally:
+        for future in pending:
+            future.cancel()
+        network.shutdown(wait=False)
+        parsers.shutdown(wait=False)
+
+def fetch_website_content(url, single_page=False):
+    result = new_crawl_result()
+    start_time = time.time()
+
+    content = [page["text"] for page in crawl_website(url, single_page, result)]
+
+    result["content"] = ' '.join(content).strip()
     result["stats"]["scraping_time"] = time.time() - start_time
     result["stats"]["total_words"] = len(result["content"].split())
-    result["content"] = result["content"].strip()
     
     return result
 
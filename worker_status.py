@@ -0,0 +1,63 @@
+import threading
+import time
+from config import Config
+from redis_client import get_redis
+
+READY_KEY = "iris:workers:ready"
+SLOTS_KEY = "iris:workers:slots"
+BUSY_KEY = "iris:workers:busy"
+
+def mark_worker_ready(hostname, slots, busy=None):
+    # Each heartbeat pushes the worker's expiry forward; a worker that dies simply ages out
+    redis_client = get_redis()
+    now = time.time()
+    pipe = redis_client.pipeline()
+    pipe.zadd(READY_KEY, {hostname: now + 3 * Config.WORKER_READY_INTERVAL})
+    pipe.zremrangebyscore(READY_KEY, '-inf', now)
+    pipe.hset(SLOTS_KEY, hostname, slots)
+    if busy is not None:
+        # The worker's own count corrects any drift from tasks that died without finishing
+        pipe.hset(BUSY_KEY, hostname, busy)
+    pipe.execute()
+
+def mark_worker_stopped(hostname):
+    pipe = get_redis().pipeline()
+    pipe.zrem(READY_KEY, hostname)
+    pipe.hdel(SLOTS_KEY, hostname)
+    pipe.hdel(BUSY_KEY, hostname)
+    pipe.execute()
+
+def mark_task_started(hostname):
+    get_redis().hincrby(BUSY_KEY, hostname, 1)
+
+def mark_task_finished(hostname):
+    get_redis().hincrby(BUSY_KEY, hostname, -1)
+
+def get_free_slots():
+    redis_client = get_redis()
+    hosts = redis_client.zrangebyscore(READY_KEY, time.time(), '+inf')
+    if not hosts:
+        return 0
+    slots = redis_client.hmget(SLOTS_KEY, hosts)
+    busy = redis_client.hmget(BUSY_KEY, hosts)
+    return sum(max(int(total or 0) - int(used or 0), 0) for total, used in zip(slots, busy))
+
+def has_free_workers():
+    # A warm worker that is busy with an hour-long job cannot answer a sync request in time
+    try:
+        return get_free_slots() > 0
+    except Exception:
+        return False
+
+def start_ready_heartbeat(hostname, slots, get_busy=None):
+    def beat():
+        while True:
+            try:
+                mark_worker_ready(hostname, slots, get_busy() if get_busy else None)
+            except Exception as e:
+                print(f"Error refreshing readiness for {hostname}: {str(e)}")
+            time.sleep(Config.WORKER_READY_INTERVAL)
+
+    thread = threading.Thread(target=beat, name='iris-ready-heartbeat', daemon=True)
+    thread.start()
+    return thread